@@ -1,18 +1,20 @@
 # https://docs.sqlalchemy.org/en/20/orm/extensions/mypy.html
 # mypy: disable-error-code=arg-type
+from collections.abc import Callable
 from datetime import datetime
 from enum import Enum
 from itertools import groupby
 from typing import Any
 
+import orjson
 from dateutil.relativedelta import relativedelta
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse, StreamingResponse
 from fastapi_socketio import SocketManager
-from sqlalchemy import func
+from sqlalchemy import FromClause, Integer, Row, Select, Table, cast, func, or_, select, tuple_
+from sqlalchemy.orm import Query as ORMQuery
 from sqlalchemy.orm import Session
-from sqlalchemy.orm.query import Query
 
 from . import models
 from .config import Config
@@ -20,7 +22,7 @@ from .database import Database
 from .logger import DummyLogger
 
 # Initialize FastAPI server
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -35,6 +37,9 @@ logger = DummyLogger()
 config = Config()
 db = Database(logger, config)
 
+HISTORY_MAX_LIMIT = 10000
+HISTORY_BATCH_SIZE = 1000
+
 
 class Period(str, Enum):
     SECOND = "s"
@@ -45,19 +50,26 @@ class Period(str, Enum):
     MONTH = "M"
 
 
-def filter_period(period: Period | None, query: Query, model: type[models.Model]) -> Query:
-    if Period.SECOND == period:
-        query = query.filter(model.dt > datetime.now() - relativedelta(seconds=1))
-    if Period.MINUTE == period:
-        query = query.filter(model.dt > datetime.now() - relativedelta(minutes=1))
-    if Period.HOUR == period:
-        query = query.filter(model.dt > datetime.now() - relativedelta(hours=1))
-    if Period.DAY == period:
-        query = query.filter(model.dt > datetime.now() - relativedelta(days=1))
-    if Period.WEEK == period:
-        query = query.filter(model.dt > datetime.now() - relativedelta(weeks=1))
-    if Period.MONTH == period:
-        query = query.filter(model.dt > datetime.now() - relativedelta(months=1))
+PERIOD_DELTAS = {
+    Period.SECOND: relativedelta(seconds=1),
+    Period.MINUTE: relativedelta(minutes=1),
+    Period.HOUR: relativedelta(hours=1),
+    Period.DAY: relativedelta(days=1),
+    Period.WEEK: relativedelta(weeks=1),
+    Period.MONTH: relativedelta(months=1),
+}
+
+
+def period_start(period: Period | None) -> datetime | None:
+    if period is None:
+        return None
+    return datetime.now() - PERIOD_DELTAS[period]
+
+
+def filter_period(period: Period | None, query: ORMQuery, model: type[models.Model]) -> ORMQuery:
+    since = period_start(period)
+    if since is not None:
+        query = query.filter(model.dt > since)
     return query
 
 
@@ -66,60 +78,251 @@ def redirect_to_docs():
     return RedirectResponse(url="/docs")
 
 
+def encode_cursor(row: Row) -> str:
+    return f"{row.dt.isoformat()}_{row.id}"
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    dt, _, row_id = cursor.rpartition("_")
+    try:
+        return datetime.fromisoformat(dt), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+
+
+def history_response(
+    query: Select,
+    table: FromClause,
+    serialize: Callable[[Row], dict[str, Any]],
+    after: str | None,
+    limit: int | None,
+    stream: bool,
+):
+    # (dt, id) is unique in every history source, so keyset pages are stable. Only plain tables
+    # seek through their dt index though: the partition and rollup unions and the downsampled
+    # subqueries have no index and are scanned and sorted in full for every page
+    query = query.order_by(table.c.dt.asc(), table.c.id.asc())
+    if after is not None:
+        query = query.where(tuple_(table.c.dt, table.c.id) > decode_cursor(after))
+    if limit is not None:
+        query = query.limit(limit)
+    if stream:
+
+        def generate_ndjson():
+            with db.engine.connect() as connection:
+                result = connection.execution_options(yield_per=HISTORY_BATCH_SIZE).execute(query)
+                for rows in result.partitions():
+                    yield b"".join(orjson.dumps(serialize(row)) + b"\n" for row in rows)
+
+        return StreamingResponse(generate_ndjson(), media_type="application/x-ndjson")
+    # Returning the response directly skips FastAPI's jsonable_encoder pass over plain dicts
+    with db.engine.connect() as connection:
+        if limit is None:
+            return ORJSONResponse([serialize(row) for row in connection.execute(query)])
+        rows = connection.execute(query).all()
+    return ORJSONResponse(
+        {
+            "items": [serialize(row) for row in rows],
+            "next": encode_cursor(rows[-1]) if len(rows) == limit else None,
+        }
+    )
+
+
+def value_history_query(period: Period | None) -> tuple[Select, FromClause]:
+    cv_t = models.CoinValue.__table__
+    since = period_start(period)
+    # Raw samples are only kept for a day, longer periods read the rollups
+    if period not in (Period.WEEK, Period.MONTH, None):
+        return select(cv_t).where(cv_t.c.dt > since), cv_t
+    interval = models.Interval.HOURLY if period is not None else models.Interval.DAILY
+    rollup_t = models.CoinValueRollup.__table__
+    watermark_t = models.RollupWatermark.__table__
+    rolled_up = select(
+        rollup_t.c.id,
+        rollup_t.c.coin_id,
+        rollup_t.c.balance,
+        rollup_t.c.usd_price,
+        rollup_t.c.btc_price,
+        rollup_t.c.dt,
+    ).where(rollup_t.c.interval == interval)
+    # Samples the rollup hasn't reached yet are served raw; their ids are negated so that
+    # (dt, id) stays unique across both tables
+    last_id = select(watermark_t.c.last_id).where(watermark_t.c.interval == interval)
+    pending = select(
+        (-cv_t.c.id).label("id"),
+        cv_t.c.coin_id,
+        cv_t.c.balance,
+        cv_t.c.usd_price,
+        cv_t.c.btc_price,
+        cv_t.c.dt,
+    ).where(cv_t.c.id > func.coalesce(last_id.scalar_subquery(), 0))
+    if since is not None:
+        rolled_up = rolled_up.where(rollup_t.c.dt > since)
+        pending = pending.where(cv_t.c.dt > since)
+    table = rolled_up.union_all(pending).subquery("coin_values")
+    return select(table), table
+
+
+def downsample(query: Select, value: str, max_points: int, *groups: str) -> Select:
+    # Min/max bucketing: split the time range into max_points // 2 buckets per group and keep
+    # the lowest and highest point of each bucket, so peaks survive the downsampling
+    buckets = max(max_points // 2, 1)
+    points = query.subquery("points")
+    jd = func.julianday(points.c.dt)
+    first_jd = func.min(jd).over()
+    span = func.nullif(func.max(jd).over() - first_jd, 0)
+    bucket = func.coalesce(
+        func.min(cast((jd - first_jd) / span * buckets, Integer), buckets - 1), 0
+    )
+    bucketed = select(points, bucket.label("bucket")).subquery("bucketed")
+    partition_by = [bucketed.c[group] for group in groups] + [bucketed.c.bucket]
+    ranked = select(
+        bucketed,
+        func.row_number()
+        .over(partition_by=partition_by, order_by=bucketed.c[value].asc())
+        .label("low_rank"),
+        func.row_number()
+        .over(partition_by=partition_by, order_by=bucketed.c[value].desc())
+        .label("high_rank"),
+    ).subquery("ranked")
+    return select(*(ranked.c[column.name] for column in points.c)).where(
+        or_(ranked.c.low_rank == 1, ranked.c.high_rank == 1)
+    )
+
+
+def value_info(row: Row) -> dict[str, Any]:
+    return {
+        "coin": row.coin_id,
+        "balance": row.balance,
+        "usd_value": None if row.usd_price is None else row.balance * row.usd_price,
+        "btc_value": None if row.btc_price is None else row.balance * row.btc_price,
+        "dt": row.dt.isoformat(),
+    }
+
+
 @app.get("/api/v1/value_history")
-def value_history(period: Period | None = None, coin: str | None = None):
-    session: Session
-    with db.db_session() as session:
-        query = session.query(models.CoinValue).order_by(
-            models.CoinValue.coin_id.asc(), models.CoinValue.dt.asc()
+def value_history(
+    period: Period | None = None,
+    coin: str | None = None,
+    after: str | None = None,
+    limit: int | None = Query(None, ge=1, le=HISTORY_MAX_LIMIT),
+    stream: bool = False,
+    max_points: int | None = Query(None, ge=2),
+):
+    query, table = value_history_query(period)
+    if coin:
+        query = query.where(table.c.coin_id == coin)
+    if max_points is not None:
+        query = query.add_columns((table.c.balance * table.c.usd_price).label("usd_value"))
+        sampled = downsample(query, "usd_value", max_points, "coin_id").subquery("sampled")
+        query, table = select(sampled), sampled
+    if coin or after is not None or limit is not None or stream:
+        return history_response(query, table, value_info, after, limit, stream)
+    query = query.order_by(table.c.coin_id.asc(), table.c.dt.asc())
+    with db.engine.connect() as connection:
+        coin_values = groupby(connection.execute(query), key=lambda row: row.coin_id)
+        return ORJSONResponse(
+            {coin_id: [value_info(row) for row in history] for coin_id, history in coin_values}
         )
-        query = filter_period(period, query, models.CoinValue)
-        if coin:
-            values: list[models.CoinValue] = query.filter(models.CoinValue.coin_id == coin).all()
-            return [entry.info() for entry in values]
-        coin_values = groupby(query.all(), key=lambda cv: cv.coin)
-        return {coin.symbol: [entry.info() for entry in history] for coin, history in coin_values}
 
 
 @app.get("/api/v1/total_value_history")
-def total_value_history(period: Period | None = None):
-    session: Session
-    with db.db_session() as session:
-        query = session.query(
-            models.CoinValue.dt,
-            func.sum(models.CoinValue.btc_value),
-            func.sum(models.CoinValue.usd_value),
-        ).group_by(models.CoinValue.dt)
-        query = filter_period(period, query, models.CoinValue)
-        total_values: list[tuple[datetime, float, float]] = query.all()
-        return [{"datetime": tv[0], "btc": tv[1], "usd": tv[2]} for tv in total_values]
+def total_value_history(period: Period | None = None, max_points: int | None = Query(None, ge=2)):
+    query, table = value_history_query(period)
+    query = query.with_only_columns(
+        table.c.dt,
+        func.sum(table.c.balance * table.c.btc_price).label("btc"),
+        func.sum(table.c.balance * table.c.usd_price).label("usd"),
+    ).group_by(table.c.dt)
+    if max_points is not None:
+        sampled = downsample(query, "usd", max_points).subquery("sampled")
+        query = select(sampled).order_by(sampled.c.dt.asc())
+    with db.engine.connect() as connection:
+        total_values = connection.execute(query).all()
+    return ORJSONResponse(
+        [{"datetime": tv.dt, "btc": tv.btc, "usd": tv.usd} for tv in total_values]
+    )
+
+
+def trade_info(row: Row) -> dict[str, Any]:
+    return {
+        "id": row.id,
+        "alt_coin": row.alt_coin_id,
+        "crypto_coin": row.crypto_coin_id,
+        "selling": row.selling,
+        "state": row.state.value,
+        "alt_starting_balance": row.alt_starting_balance,
+        "alt_trade_amount": row.alt_trade_amount,
+        "crypto_starting_balance": row.crypto_starting_balance,
+        "crypto_trade_amount": row.crypto_trade_amount,
+        "dt": row.dt.isoformat(),
+    }
 
 
 @app.get("/api/v1/trade_history")
-def trade_history(period: Period | None = None):
-    session: Session
-    with db.db_session() as session:
-        query = session.query(models.Trade).order_by(models.Trade.dt.asc())
-        query = filter_period(period, query, models.Trade)
-        trades: list[models.Trade] = query.all()
-        return [trade.info() for trade in trades]
+def trade_history(
+    period: Period | None = None,
+    after: str | None = None,
+    limit: int | None = Query(None, ge=1, le=HISTORY_MAX_LIMIT),
+    stream: bool = False,
+):
+    table = models.Trade.__table__
+    query = select(table)
+    since = period_start(period)
+    if since is not None:
+        query = query.where(table.c.dt > since)
+    return history_response(query, table, trade_info, after, limit, stream)
+
+
+def join_pair_coins(query: Select, pair_t: Table) -> Select:
+    from_coin_t = models.Coin.__table__.alias("from_coin")
+    to_coin_t = models.Coin.__table__.alias("to_coin")
+    return (
+        query.add_columns(
+            from_coin_t.c.symbol.label("from_symbol"),
+            from_coin_t.c.enabled.label("from_enabled"),
+            to_coin_t.c.symbol.label("to_symbol"),
+            to_coin_t.c.enabled.label("to_enabled"),
+        )
+        .join(from_coin_t, from_coin_t.c.symbol == pair_t.c.from_coin_id)
+        .join(to_coin_t, to_coin_t.c.symbol == pair_t.c.to_coin_id)
+    )
+
+
+def pair_coins_info(row: Row) -> dict[str, Any]:
+    return {
+        "from_coin": {"symbol": row.from_symbol, "enabled": row.from_enabled},
+        "to_coin": {"symbol": row.to_symbol, "enabled": row.to_enabled},
+    }
+
+
+def scout_info(row: Row) -> dict[str, Any]:
+    return {
+        **pair_coins_info(row),
+        "ratio_diff": row.ratio_diff,
+        "current_ratio": row.current_coin_price / row.other_coin_price,
+        "target_ratio": row.target_ratio,
+        "current_coin_price": row.current_coin_price,
+        "other_coin_price": row.other_coin_price,
+        "dt": row.dt.isoformat(),
+    }
 
 
 @app.get("/api/v1/scouting_history")
-def scouting_history(period: Period | None = None):
+def scouting_history(
+    period: Period | None = None,
+    after: str | None = None,
+    limit: int | None = Query(None, ge=1, le=HISTORY_MAX_LIMIT),
+    stream: bool = False,
+):
     _current_coin = db.get_current_coin()
     coin = _current_coin.symbol if _current_coin is not None else None
-    session: Session
-    with db.db_session() as session:
-        query = (
-            session.query(models.ScoutHistory)
-            .join(models.ScoutHistory.pair)
-            .filter(models.Pair.from_coin_id == coin)
-            .order_by(models.ScoutHistory.dt.asc())
-        )
-        query = filter_period(period, query, models.ScoutHistory)
-        scouts: list[models.ScoutHistory] = query.all()
-        return [scout.info() for scout in scouts]
+    scout_t = db.scout_history_query(period_start(period))
+    pair_t = models.Pair.__table__
+    query = join_pair_coins(
+        select(scout_t).join(pair_t, pair_t.c.id == scout_t.c.pair_id), pair_t
+    ).where(pair_t.c.from_coin_id == coin)
+    return history_response(query, scout_t, scout_info, after, limit, stream)
 
 
 @app.get("/api/v1/current_coin")
@@ -149,12 +352,20 @@ def coins():
 
 @app.get("/api/v1/pairs")
 def pairs():
-    session: Session
-    with db.db_session() as session:
-        all_pairs: list[models.Pair] = session.query(models.Pair).all()
-        return [pair.info() for pair in all_pairs]
+    pair_t = models.Pair.__table__
+    query = join_pair_coins(select(pair_t.c.ratio), pair_t).order_by(pair_t.c.id.asc())
+    with db.engine.connect() as connection:
+        return ORJSONResponse(
+            [{**pair_coins_info(row), "ratio": row.ratio} for row in connection.execute(query)]
+        )
 
 
 @sio.on("update", namespace="/backend")
 async def on_update(sid: str, msg: Any):
     await sio.emit("update", msg, namespace="/frontend")
+
+
+@sio.on("updates", namespace="/backend")
+async def on_updates(sid: str, msg: Any):
+    for update in msg["updates"]:
+        await sio.emit("update", update, namespace="/frontend")
@@ -1,15 +1,16 @@
+import math
 import time
 from abc import ABC, abstractmethod
-from collections import defaultdict
 from datetime import datetime
 
-from sqlalchemy.orm import Session
+import numpy as np
 
 from .binance import BinanceAPIManager
+from .binance_ws import MARKET_BUY, MARKET_SELL, MARKET_SELL_FILL_QUOTE, MarketPriceRequest
 from .config import Config
 from .database import Database, LogScout
 from .logger import AbstractLogger
-from .models import CoinValue, Pair
+from .models import CoinValue
 from .postpone import postpone_heavy_calls
 from .ratios import CoinStub
 
@@ -26,6 +27,12 @@ class AutoTrader(ABC):
         self.config = config
         self.db = database
         self.manager = binance_manager
+        self._buy_versions = np.empty(0, dtype=np.int64)
+        self._buy_buckets = np.empty(0)
+        self._buy_quotes = np.empty(0)
+        self._buy_prices = np.empty(0)
+        self._buy_amounts = np.empty(0)
+        self._trigger_rows: dict[int, tuple[float, np.ndarray, np.ndarray]] = {}
 
     @abstractmethod
     def scout(self):
@@ -37,19 +44,112 @@ class AutoTrader(ABC):
             for coin in CoinStub.get_all()
         }
         bridge_balance = self.manager.get_currency_balance(self.config.BRIDGE.symbol)
-        max_quote_amount = bridge_balance
+        requests = [
+            MarketPriceRequest(symbol + self.config.BRIDGE.symbol, MARKET_SELL, amount)
+            for symbol, amount in balances.items()
+        ]
         while True:
-            for symbol, amount in balances.items():
-                _, quote_amount = self.manager.get_market_sell_price(
-                    symbol + self.config.BRIDGE.symbol, amount
-                )
-                if quote_amount is None:
-                    break
-                max_quote_amount = max(max_quote_amount, quote_amount)
-            else:
+            _, quote_amounts = self.manager.get_market_prices(requests)
+            if not np.isnan(quote_amounts).any():
                 break
             time.sleep(1)
-        return max_quote_amount
+        return max(bridge_balance, quote_amounts.max(initial=0.0))
+
+    def _quote_bucket(self, quote_amount: float) -> float:
+        # Quotes within SCOUT_QUOTE_TOLERANCE of each other share a bucket and reuse buy prices
+        if quote_amount <= 0:
+            return np.nan
+        return math.floor(math.log(quote_amount) / math.log1p(self.config.SCOUT_QUOTE_TOLERANCE))
+
+    def _get_buy_prices(self, quote_amount: float) -> tuple[np.ndarray, np.ndarray]:
+        symbols = [coin.symbol + self.config.BRIDGE.symbol for coin in CoinStub.get_all()]
+        if len(self._buy_prices) != len(symbols):
+            self._buy_versions = np.full(len(symbols), -1, dtype=np.int64)
+            self._buy_buckets = np.full(len(symbols), np.nan)
+            self._buy_quotes = np.full(len(symbols), np.nan)
+            self._buy_prices = np.full(len(symbols), np.nan)
+            self._buy_amounts = np.full(len(symbols), np.nan)
+        versions = self.manager.get_depth_versions(symbols)
+        bucket = self._quote_bucket(quote_amount)
+        stale = self._buy_buckets != bucket
+        if versions is None:
+            stale[:] = True
+        else:
+            stale |= self._buy_versions != versions
+        stale_idxs = np.flatnonzero(stale)
+        if len(stale_idxs) > 0:
+            prices, amounts = self.manager.get_market_prices(
+                [MarketPriceRequest(symbols[i], MARKET_BUY, quote_amount) for i in stale_idxs]
+            )
+            self._buy_prices[stale_idxs] = prices
+            self._buy_amounts[stale_idxs] = amounts
+            self._buy_buckets[stale_idxs] = bucket
+            self._buy_quotes[stale_idxs] = quote_amount
+            if versions is not None:
+                self._buy_versions[stale_idxs] = versions[stale_idxs]
+        if quote_amount <= 0:
+            return self._buy_prices.copy(), self._buy_amounts.copy()
+        # Amounts scale with the quote even when the fill price is reused
+        return self._buy_prices.copy(), self._buy_amounts * (quote_amount / self._buy_quotes)
+
+    def _ratio_row(
+        self,
+        coin_sell_price: float,
+        buy_prices: np.ndarray,
+        transaction_fees: np.ndarray,
+        target_ratios: np.ndarray,
+    ) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            coin_opt_coin_ratios = coin_sell_price / buy_prices
+            if self.config.USE_MARGIN:
+                return (
+                    (1 - transaction_fees) * coin_opt_coin_ratios / target_ratios
+                    - 1
+                    - self.config.SCOUT_MARGIN / 100
+                )
+            return (
+                coin_opt_coin_ratios
+                - transaction_fees * self.config.SCOUT_MULTIPLIER * coin_opt_coin_ratios
+            ) - target_ratios
+
+    def _ratio_thresholds(
+        self, transaction_fees: np.ndarray, target_ratios: np.ndarray
+    ) -> np.ndarray:
+        # Minimum sell/buy price ratio at which _ratio_row turns positive
+        if self.config.USE_MARGIN:
+            return target_ratios * (1 + self.config.SCOUT_MARGIN / 100) / (1 - transaction_fees)
+        return target_ratios / (1 - transaction_fees * self.config.SCOUT_MULTIPLIER)
+
+    def _publish_trigger_prices(self, reset: bool = False):
+        if reset:
+            self._trigger_rows.clear()
+        if self.config.SCOUT_MODE != "event":
+            return
+        if not self._trigger_rows:
+            self.manager.set_trigger_prices(None)
+            return
+        n = CoinStub.len_coins()
+        ask_below = np.zeros(n)
+        bid_above = np.full(n, np.inf)
+        for from_idx, (coin_sell_price, buy_prices, transaction_fees) in self._trigger_rows.items():
+            thresholds = self._ratio_thresholds(
+                transaction_fees, np.frombuffer(self.db.ratios_manager.get_from_coin(from_idx))
+            )
+            with np.errstate(divide="ignore", invalid="ignore"):
+                asks = coin_sell_price / thresholds
+                # The held coin is never its own jump target
+                asks[from_idx] = np.nan
+                ask_below = np.fmax(ask_below, asks)
+                bid_above[from_idx] = np.fmin.reduce(
+                    thresholds * buy_prices, initial=bid_above[from_idx]
+                )
+        bridge = self.config.BRIDGE.symbol
+        self.manager.set_trigger_prices(
+            {
+                coin.symbol + bridge: (float(ask_below[coin.idx]), float(bid_above[coin.idx]))
+                for coin in CoinStub.get_all()
+            }
+        )
 
     def _get_ratios(
         self,
@@ -57,101 +157,167 @@ class AutoTrader(ABC):
         coin_sell_price: float,
         quote_amount: float,
         enable_scout_log: bool = True,
-    ):
-        ratio_dict: dict[tuple[int, int], float] = {}
-        price_amounts: dict[str, tuple[float, float]] = {}
-        scout_logs = []
-        for to_idx, target_ratio in enumerate(self.db.ratios_manager.get_from_coin(coin.idx)):
-            if coin.idx == to_idx:
-                continue
-            to_coin = CoinStub.get_by_idx(to_idx)
-            optional_coin_buy_price, optional_coin_amount = self.manager.get_market_buy_price(
-                to_coin.symbol + self.config.BRIDGE.symbol, quote_amount
-            )
-            if optional_coin_buy_price is None:
+        enable_trigger_index: bool = True,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        to_coins = [to_coin for to_coin in CoinStub.get_all() if to_coin is not coin]
+        buy_prices, amounts = self._get_buy_prices(quote_amount)
+        buy_prices[coin.idx] = amounts[coin.idx] = np.nan
+        for to_coin in to_coins:
+            if np.isnan(buy_prices[to_coin.idx]):
                 self.logger.info(
                     f"Market price for coin {to_coin.symbol + self.config.BRIDGE.symbol} can't be calculated, skipping"
                 )
-                continue
-            price_amounts[to_coin.symbol] = (optional_coin_buy_price, optional_coin_amount)
-            coin_opt_coin_ratio = coin_sell_price / optional_coin_buy_price
-            from_fee = self.manager.get_fee(coin.symbol, self.config.BRIDGE.symbol, selling=True)
-            to_fee = self.manager.get_fee(to_coin.symbol, self.config.BRIDGE.symbol, selling=False)
-            transaction_fee = from_fee + to_fee - from_fee * to_fee
-            if self.config.USE_MARGIN:
-                ratio_dict[(coin.idx, to_coin.idx)] = (
-                    (1 - transaction_fee) * coin_opt_coin_ratio / target_ratio
-                    - 1
-                    - self.config.SCOUT_MARGIN / 100
+        to_fees = self.manager.get_fees(self.config.BRIDGE.symbol, selling=False)
+        from_fee = self.manager.get_fees(self.config.BRIDGE.symbol, selling=True)[coin.idx]
+        transaction_fees = from_fee + to_fees - from_fee * to_fees
+        target_ratios = np.frombuffer(self.db.ratios_manager.get_from_coin(coin.idx))
+        ratios = self._ratio_row(coin_sell_price, buy_prices, transaction_fees, target_ratios)
+        if enable_scout_log and enable_trigger_index and self.config.SCOUT_MODE == "event":
+            self._trigger_rows[coin.idx] = (coin_sell_price, buy_prices.copy(), transaction_fees)
+        if enable_scout_log:
+            scout_logs = [
+                LogScout(
+                    self.db.ratios_manager.get_pair_id(coin.idx, to_idx),
+                    float(ratios[to_idx]),
+                    float(target_ratios[to_idx]),
+                    coin_sell_price,
+                    float(buy_prices[to_idx]),
                 )
-            else:
-                ratio_dict[(coin.idx, to_coin.idx)] = (
-                    coin_opt_coin_ratio
-                    - transaction_fee * self.config.SCOUT_MULTIPLIER * coin_opt_coin_ratio
-                ) - target_ratio
-            if enable_scout_log:
-                scout_logs.append(
-                    LogScout(
-                        self.db.ratios_manager.get_pair_id(coin.idx, to_idx),
-                        ratio_dict[(coin.idx, to_coin.idx)],
-                        target_ratio,
-                        coin_sell_price,
-                        optional_coin_buy_price,
-                    )
-                )
-        if scout_logs:
-            self.db.batch_log_scout(scout_logs)
-        return ratio_dict, price_amounts
+                for to_idx in np.flatnonzero(~np.isnan(buy_prices))
+            ]
+            if scout_logs:
+                self.db.batch_log_scout(scout_logs)
+        return ratios, buy_prices, amounts
 
-    @postpone_heavy_calls
-    def _jump_to_best_coin(
+    def _greedy_jump_chain(
         self, coin: CoinStub, coin_sell_price: float, quote_amount: float, coin_amount: float
-    ):
-        can_walk_deeper = True
-        jump_chain = [coin.symbol]
-        last_coin: CoinStub = coin
+    ) -> tuple[list[CoinStub], float] | None:
+        jump_chain = [coin]
         last_coin_sell_price = coin_sell_price
         last_coin_buy_price = 0.0
         last_coin_quote = quote_amount
         last_coin_amount = coin_amount
-        bridge_balance = self.manager.get_currency_balance(self.config.BRIDGE.symbol)
-        is_initial_coin = True
-        while can_walk_deeper:
+        while True:
+            last_coin = jump_chain[-1]
+            is_initial_coin = len(jump_chain) == 1
             if not is_initial_coin:
                 last_coin_sell_price, last_coin_quote = self.manager.get_market_sell_price(
                     last_coin.symbol + self.config.BRIDGE.symbol, last_coin_amount
                 )
                 if last_coin_sell_price is None:
-                    self.db.ratios_manager.rollback()
-                    return
-            ratio_dict, prices = self._get_ratios(
+                    return None
+            ratios, buy_prices, amounts = self._get_ratios(
                 last_coin, last_coin_sell_price, last_coin_quote, enable_scout_log=is_initial_coin
             )
-            ratio_dict = {k: v for k, v in ratio_dict.items() if v > 0}
-            if ratio_dict:
-                new_best_pair = max(ratio_dict, key=ratio_dict.get)
-                new_best_coin = CoinStub.get_by_idx(new_best_pair[1])
-                if not is_initial_coin:
-                    if not self.update_trade_threshold(
-                        last_coin,
-                        new_best_coin,
-                        last_coin_buy_price,
-                        last_coin_amount,
-                        last_coin_quote,
-                    ):
-                        self.db.ratios_manager.rollback()
-                        return
-                last_coin = new_best_coin
-                last_coin_buy_price, last_coin_amount = prices[last_coin.symbol]
-                jump_chain.append(last_coin.symbol)
-                is_initial_coin = False
-            else:
-                can_walk_deeper = False
+            ratios = np.where(ratios > 0, ratios, 0.0)
+            best_idx = int(ratios.argmax())
+            if ratios[best_idx] <= 0:
+                return jump_chain, last_coin_buy_price
+            new_best_coin = CoinStub.get_by_idx(best_idx)
+            if not is_initial_coin:
+                if not self.update_trade_threshold(
+                    last_coin,
+                    new_best_coin,
+                    last_coin_buy_price,
+                    last_coin_amount,
+                    last_coin_quote,
+                ):
+                    return None
+            last_coin_buy_price = float(buy_prices[best_idx])
+            last_coin_amount = float(amounts[best_idx])
+            jump_chain.append(new_best_coin)
+
+    def _graph_jump_chain(
+        self, coin: CoinStub, coin_sell_price: float, quote_amount: float
+    ) -> tuple[list[CoinStub], float] | None:
+        coins = CoinStub.get_all()
+        n = len(coins)
+        bridge = self.config.BRIDGE.symbol
+        _, buy_prices, amounts = self._get_ratios(coin, coin_sell_price, quote_amount)
+        sell_prices, _ = self.manager.get_market_prices(
+            [
+                MarketPriceRequest(c.symbol + bridge, MARKET_SELL_FILL_QUOTE, quote_amount)
+                for c in coins
+            ]
+        )
+        sell_prices[coin.idx] = coin_sell_price
+        buy_fees = self.manager.get_fees(bridge, selling=False)
+        sell_fees = self.manager.get_fees(bridge, selling=True)
+        transaction_fees = np.add.outer(sell_fees, buy_fees) - np.multiply.outer(
+            sell_fees, buy_fees
+        )
+        target_ratios = np.frombuffer(self.db.ratios_manager.get_all()).reshape(n, n)
+        # An edge gains its price ratio over the threshold, in either scoring mode, so a path's
+        # weight is the log of its compounded gain
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gains = (sell_prices[:, np.newaxis] / buy_prices) / self._ratio_thresholds(
+                transaction_fees, target_ratios
+            )
+            weights = np.where(gains > 1, np.log(gains), -np.inf)
+        weights[:, coin.idx] = -np.inf
+        frontier = np.full(n, -np.inf)
+        frontier[coin.idx] = 0.0
+        paths = {coin.idx: [coin.idx]}
+        best_weight, best_path = 0.0, paths[coin.idx]
+        for _ in range(self.config.SCOUT_MAX_HOPS):
+            candidates = frontier[:, np.newaxis] + weights
+            for from_idx, path in paths.items():
+                candidates[from_idx, path] = -np.inf
+            parents = candidates.argmax(axis=0)
+            frontier = candidates[parents, np.arange(n)]
+            paths = {
+                int(to_idx): paths[parents[to_idx]] + [int(to_idx)]
+                for to_idx in np.flatnonzero(np.isfinite(frontier))
+            }
+            if not paths:
+                break
+            to_idx = int(frontier.argmax())
+            if frontier[to_idx] > best_weight:
+                best_weight, best_path = frontier[to_idx], paths[to_idx]
+        if len(best_path) < 2:
+            return [coin], 0.0
+        # The search prices every hop at the initial quote; walk the chosen path with the amounts
+        # each hop actually yields, like the greedy chain does
+        hop_buy_price = float(buy_prices[best_path[1]])
+        hop_amount = float(amounts[best_path[1]])
+        for hop_idx, next_idx in zip(best_path[1:-1], best_path[2:]):
+            hop_coin, next_coin = CoinStub.get_by_idx(hop_idx), CoinStub.get_by_idx(next_idx)
+            hop_sell_price, hop_quote = self.manager.get_market_sell_price(
+                hop_coin.symbol + bridge, hop_amount
+            )
+            if hop_sell_price is None:
+                return None
+            if not self.update_trade_threshold(
+                hop_coin, next_coin, hop_buy_price, hop_amount, hop_quote
+            ):
+                return None
+            hop_buy_price, hop_amount = self.manager.get_market_buy_price(
+                next_coin.symbol + bridge, hop_quote
+            )
+            if hop_buy_price is None:
+                return None
+        return [CoinStub.get_by_idx(idx) for idx in best_path], hop_buy_price
+
+    @postpone_heavy_calls
+    def _jump_to_best_coin(
+        self, coin: CoinStub, coin_sell_price: float, quote_amount: float, coin_amount: float
+    ):
+        bridge_balance = self.manager.get_currency_balance(self.config.BRIDGE.symbol)
+        if self.config.SCOUT_JUMP_SEARCH == "graph":
+            jump = self._graph_jump_chain(coin, coin_sell_price, quote_amount)
+        else:
+            jump = self._greedy_jump_chain(coin, coin_sell_price, quote_amount, coin_amount)
+        if jump is None:
+            self.db.ratios_manager.rollback()
+            return
+        jump_chain, last_coin_buy_price = jump
+        last_coin = jump_chain[-1]
         self.db.commit_ratios()
-        if not is_initial_coin:
+        self._publish_trigger_prices(reset=last_coin is not coin)
+        if len(jump_chain) > 1:
             if len(jump_chain) > 2:
-                self.logger.info(f"Squashed jump chain: {jump_chain}")
-            if jump_chain[0] != jump_chain[-1]:
+                self.logger.info(f"Squashed jump chain: {[c.symbol for c in jump_chain]}")
+            if last_coin is not coin:
                 self.logger.info(f"Will be jumping from {coin.symbol} to {last_coin.symbol}")
                 result = self.transaction_through_bridge(
                     coin, last_coin, coin_sell_price, last_coin_buy_price
@@ -232,26 +398,35 @@ class AutoTrader(ABC):
                 f"Skipping update... current coin {to_coin.symbol + self.config.BRIDGE.symbol} not found"
             )
             return False
-        for coin in CoinStub.get_all():
-            if coin is to_coin:
-                continue
-            coin_price, _ = self.manager.get_market_sell_price_fill_quote(
-                coin.symbol + self.config.BRIDGE.symbol, quote_amount
+        coins = [coin for coin in CoinStub.get_all() if coin is not to_coin]
+        requests = [
+            MarketPriceRequest(
+                coin.symbol + self.config.BRIDGE.symbol, MARKET_SELL_FILL_QUOTE, quote_amount
             )
-            if coin_price is None:
+            for coin in coins
+        ]
+        if from_coin is not None:
+            requests.append(
+                MarketPriceRequest(
+                    from_coin.symbol + self.config.BRIDGE.symbol, MARKET_BUY, quote_amount
+                )
+            )
+            requests.append(
+                MarketPriceRequest(
+                    to_coin.symbol + self.config.BRIDGE.symbol, MARKET_SELL, to_coin_amount
+                )
+            )
+        prices, _ = self.manager.get_market_prices(requests)
+        for coin, coin_price in zip(coins, prices):
+            if np.isnan(coin_price):
                 self.logger.info(
                     f"Update for coin {coin.symbol + self.config.BRIDGE.symbol} can't be performed, not enough orders in order book"
                 )
                 return False
             self.db.ratios_manager.set(coin.idx, to_coin.idx, coin_price / to_coin_buy_price)
         if from_coin is not None:
-            from_coin_buy_price, _ = self.manager.get_market_buy_price(
-                from_coin.symbol + self.config.BRIDGE.symbol, quote_amount
-            )
-            to_coin_sell_price, _ = self.manager.get_market_sell_price(
-                to_coin.symbol + self.config.BRIDGE.symbol, to_coin_amount
-            )
-            if from_coin_buy_price is None or to_coin_sell_price is None:
+            from_coin_buy_price, to_coin_sell_price = prices[-2:]
+            if np.isnan(from_coin_buy_price) or np.isnan(to_coin_sell_price):
                 self.logger.info(
                     f"Can't update reverse pair {to_coin.symbol}->{from_coin.symbol}, not enough orders in order book"
                 )
@@ -266,52 +441,44 @@ class AutoTrader(ABC):
             )
         return True
 
-    # FIXME: Ruff(C901)
     def initialize_trade_thresholds(self):
         ratios_manager = self.db.ratios_manager
         max_quote_amount = self._max_value_in_wallet()
-        session: Session
-        with self.db.db_session() as session:
-            pairs = session.query(Pair).filter(Pair.ratio.is_(None)).all()
-            grouped_pairs = defaultdict(list)
-            for pair in pairs:
-                if pair.from_coin.enabled and pair.to_coin.enabled:
-                    grouped_pairs[pair.from_coin.symbol].append(pair)
-            for from_coin_symbol, group in grouped_pairs.items():
-                from_coin_idx = CoinStub.get_by_symbol(from_coin_symbol).idx
-                self.logger.info(
-                    f"Initializing {from_coin_symbol} vs [{', '.join([p.to_coin.symbol for p in group])}]"
-                )
-                for pair in group:
-                    for _ in range(10):
-                        from_coin_price, _ = self.manager.get_market_sell_price_fill_quote(
-                            from_coin_symbol + self.config.BRIDGE.symbol, max_quote_amount
-                        )
-                        if from_coin_price is not None:
-                            break
-                        time.sleep(1)
-                    if from_coin_price is None:
-                        self.logger.info(
-                            f"Skipping initializing {pair.from_coin + self.config.BRIDGE}, symbol not found"
-                        )
-                        continue
-                    for _ in range(10):
-                        to_coin_price, _ = self.manager.get_market_buy_price(
-                            pair.to_coin.symbol + self.config.BRIDGE.symbol, max_quote_amount
-                        )
-                        if to_coin_price is not None:
-                            break
-                        time.sleep(10)
-                    if to_coin_price is None:
-                        self.logger.info(
-                            f"Skipping initializing {pair.to_coin + self.config.BRIDGE}, symbol not found"
-                        )
-                        continue
-                    ratios_manager.set(
-                        from_coin_idx,
-                        CoinStub.get_by_symbol(pair.to_coin.symbol).idx,
-                        from_coin_price / to_coin_price,
+        n = CoinStub.len_coins()
+        missing = np.isnan(np.frombuffer(ratios_manager.get_all()).reshape(n, n))
+        np.fill_diagonal(missing, False)
+        for from_idx in np.flatnonzero(missing.any(axis=1)):
+            from_coin = CoinStub.get_by_idx(from_idx)
+            group = [CoinStub.get_by_idx(to_idx) for to_idx in np.flatnonzero(missing[from_idx])]
+            self.logger.info(
+                f"Initializing {from_coin.symbol} vs [{', '.join([c.symbol for c in group])}]"
+            )
+            for to_coin in group:
+                for _ in range(10):
+                    from_coin_price, _ = self.manager.get_market_sell_price_fill_quote(
+                        from_coin.symbol + self.config.BRIDGE.symbol, max_quote_amount
+                    )
+                    if from_coin_price is not None:
+                        break
+                    time.sleep(1)
+                if from_coin_price is None:
+                    self.logger.info(
+                        f"Skipping initializing {from_coin.symbol + self.config.BRIDGE.symbol}, symbol not found"
+                    )
+                    continue
+                for _ in range(10):
+                    to_coin_price, _ = self.manager.get_market_buy_price(
+                        to_coin.symbol + self.config.BRIDGE.symbol, max_quote_amount
                     )
+                    if to_coin_price is not None:
+                        break
+                    time.sleep(10)
+                if to_coin_price is None:
+                    self.logger.info(
+                        f"Skipping initializing {to_coin.symbol + self.config.BRIDGE.symbol}, symbol not found"
+                    )
+                    continue
+                ratios_manager.set(from_coin.idx, to_coin.idx, from_coin_price / to_coin_price)
         self.db.commit_ratios()
 
     @postpone_heavy_calls
@@ -323,14 +490,18 @@ class AutoTrader(ABC):
             for coin in coins
         ):
             return
+        # Idle bridge funds can be spent on any book move
+        self._publish_trigger_prices(reset=True)
         for coin in coins:
             current_coin_price = self.manager.get_ticker_price(
                 coin.symbol + self.config.BRIDGE.symbol
             )
             if current_coin_price is None:
                 continue
-            ratio_dict, _ = self._get_ratios(coin, current_coin_price, bridge_balance)
-            if not any(v > 0 for v in ratio_dict.values()):
+            ratios, _, _ = self._get_ratios(
+                coin, current_coin_price, bridge_balance, enable_trigger_index=False
+            )
+            if not (ratios > 0).any():
                 if bridge_balance > self.manager.get_min_notional(
                     coin.symbol, self.config.BRIDGE.symbol
                 ):
@@ -2,16 +2,25 @@ import traceback
 from collections import defaultdict
 from datetime import datetime
 
+import numpy as np
 from binance import Client
 from binance.exceptions import BinanceAPIException
 from dateutil.relativedelta import relativedelta
 from sqlitedict import SqliteDict
 
 from .binance import BinanceAPIManager, BinanceOrderBalanceManager
-from .binance_ws import BinanceCache, BinanceOrder
+from .binance_ws import (
+    MARKET_BUY,
+    MARKET_SELL,
+    MARKET_SELL_FILL_QUOTE,
+    BinanceCache,
+    BinanceOrder,
+    MarketPriceRequest,
+)
 from .config import Config
 from .database import Database, LogScout
 from .logger import DummyLogger
+from .ratios import CoinStub
 from .strategies import get_strategy
 
 cache = SqliteDict("data/cache.sqlite3", outer_stack=False)
@@ -47,6 +56,9 @@ class MockBinanceManager(BinanceAPIManager):
     def get_fee(self, origin_coin: str, target_coin: str, selling: bool):
         return 0.001
 
+    def get_fees(self, target_coin: str, selling: bool):
+        return np.full(CoinStub.len_coins(), 0.001)
+
     def get_ticker_price(self, ticker_symbol: str) -> float | None:
         target_date = self.datetime.strftime("%d %b %Y %H:%M:%S")
         key = f"{ticker_symbol} - {target_date}"
@@ -94,6 +106,24 @@ class MockBinanceManager(BinanceAPIManager):
         price = self.get_ticker_price(symbol)
         return (price, quote_amount / price) if price is not None else (None, None)
 
+    def get_market_prices(self, requests: list[MarketPriceRequest]):
+        handlers = {
+            MARKET_BUY: self.get_market_buy_price,
+            MARKET_SELL: self.get_market_sell_price,
+            MARKET_SELL_FILL_QUOTE: self.get_market_sell_price_fill_quote,
+        }
+        prices = np.full(len(requests), np.nan)
+        fills = np.full(len(requests), np.nan)
+        for i, (symbol, side, amount) in enumerate(requests):
+            price, fill = handlers[side](symbol, amount)
+            if price is not None:
+                prices[i] = price
+                fills[i] = fill
+        return prices, fills
+
+    def get_depth_versions(self, symbols: list[str]):
+        return np.full(len(symbols), int(self.datetime.timestamp()), dtype=np.int64)
+
     def buy_alt(self, origin_coin: str, target_coin: str, buy_price: float):
         target_balance = self.get_currency_balance(target_coin)
         from_coin_price = self.get_ticker_price(origin_coin + target_coin)
@@ -164,6 +194,10 @@ class MockBinanceManager(BinanceAPIManager):
 
 class MockDatabase(Database):
     DB = "sqlite:///"
+    RATIO_STORE_PATH = None
+    RATIO_JOURNAL_PATH = None
+    WRITE_BEHIND = False
+    API_URL = None
 
     def __init__(self, logger: DummyLogger, config: Config):
         super().__init__(logger, config)
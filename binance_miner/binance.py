@@ -10,15 +10,22 @@ from collections import defaultdict
 from collections.abc import Callable
 from typing import Any, TypedDict, TypeVar
 
+import numpy as np
 from binance.client import Client
 from binance.exceptions import BinanceAPIException, BinanceOrderException, BinanceRequestException
 from cachetools import TTLCache, cached
 
-from .binance_ws import BinanceCache, BinanceOrder, BinanceStreamManager, StreamManagerWorker
+from .binance_ws import (
+    BinanceCache,
+    BinanceOrder,
+    BinanceStreamManager,
+    MarketPriceRequest,
+    StreamManagerWorker,
+)
 from .config import Config
 from .database import Database
 from .logger import AbstractLogger
-from .postpone import heavy_call
+from .ratios import CoinStub
 
 T = TypeVar("T")
 
@@ -167,6 +174,7 @@ class BinanceAPIManager:
         self.cache = cache
         self.order_balance_manager = order_balance_manager
         self.stream_manager: BinanceStreamManager | None = None
+        self._fee_vectors: dict[bool, tuple[dict[str, float], tuple, np.ndarray, np.ndarray]] = {}
         self._setup_websockets()
 
     @staticmethod
@@ -238,13 +246,15 @@ class BinanceAPIManager:
             order_quantity = executed_qty
         self.logger.info(f"Bought {origin_coin}")
 
-        @heavy_call
-        def write_trade_log():
-            trade_log = self.db.start_trade_log(origin_coin, target_coin, selling=False)
-            trade_log.set_ordered(origin_balance, target_balance, order_quantity)
-            trade_log.set_complete(order.cumulative_quote_qty)
-
-        write_trade_log()
+        self.db.log_trade(
+            origin_coin,
+            target_coin,
+            False,
+            origin_balance,
+            target_balance,
+            order_quantity,
+            order.cumulative_quote_qty,
+        )
         return order
 
     def _sell_alt(self, origin_coin: str, target_coin: str, sell_price: float):
@@ -261,19 +271,29 @@ class BinanceAPIManager:
         )
         order = BinanceOrder(order)
         new_balance = self.get_currency_balance(origin_coin)
+        trade_log = None
+        if new_balance >= origin_balance:
+            # The fill arrives asynchronously, so record the open order while we wait for it
+            trade_log = self.db.start_trade_log(origin_coin, target_coin, True)
+            trade_log.set_ordered(origin_balance, target_balance, order_quantity)
         while new_balance >= origin_balance:
             balances_changed = self.cache.balances_changed_event.wait(1.0)
             self.cache.balances_changed_event.clear()
             new_balance = self.get_currency_balance(origin_coin, force=not balances_changed)
         self.logger.info(f"Sold {origin_coin}")
 
-        @heavy_call
-        def write_trade_log():
-            trade_log = self.db.start_trade_log(origin_coin, target_coin, selling=True)
-            trade_log.set_ordered(origin_balance, target_balance, order_quantity)
+        if trade_log is not None:
             trade_log.set_complete(order.cumulative_quote_qty)
-
-        write_trade_log()
+            return order
+        self.db.log_trade(
+            origin_coin,
+            target_coin,
+            True,
+            origin_balance,
+            target_balance,
+            order_quantity,
+            order.cumulative_quote_qty,
+        )
         return order
 
     def get_currency_balance(self, currency_symbol: str, force: bool = False):
@@ -288,6 +308,20 @@ class BinanceAPIManager:
     def get_market_sell_price_fill_quote(self, symbol: str, quote_amount: float):
         return self.stream_manager.get_market_sell_price_fill_quote(symbol, quote_amount)
 
+    def get_market_prices(self, requests: list[MarketPriceRequest]):
+        return self.stream_manager.get_market_prices(requests)
+
+    def get_depth_versions(self, symbols: list[str]) -> np.ndarray | None:
+        return self.stream_manager.get_depth_versions(symbols)
+
+    def set_trigger_prices(self, trigger_prices: dict[str, tuple[float, float]] | None):
+        self.cache.trigger_prices = trigger_prices
+
+    def wait_for_depth_update(self, timeout: float) -> bool:
+        depth_changed = self.cache.depth_changed_event.wait(timeout)
+        self.cache.depth_changed_event.clear()
+        return depth_changed
+
     @cached(cache=TTLCache(maxsize=1, ttl=43200))
     def get_trade_fees(self) -> dict[str, float]:
         return {
@@ -299,12 +333,9 @@ class BinanceAPIManager:
     def get_using_bnb_for_fees(self) -> bool:
         return self.binance_client.get_bnb_burn_spot_margin()["spotBNBBurn"]
 
-    def get_fee(self, origin_coin: str, target_coin: str, selling: bool):
-        if self.config != "com":
-            return 0.001
-        base_fee = self.get_trade_fees()[origin_coin + target_coin]
-        if not self.get_using_bnb_for_fees():
-            return base_fee
+    def _get_bnb_fee_amount(
+        self, origin_coin: str, target_coin: str, selling: bool, base_fee: float
+    ) -> float:
         amount_trading = (
             self.sell_quantity(origin_coin, target_coin)
             if selling
@@ -312,17 +343,68 @@ class BinanceAPIManager:
         )
         fee_amount = amount_trading * base_fee * 0.75
         if origin_coin == "BNB":
-            fee_amount_bnb = fee_amount
-        else:
-            origin_price = self.get_ticker_price(origin_coin + "BNB")
-            if origin_price is None:
-                return base_fee
-            fee_amount_bnb = fee_amount * origin_price
+            return fee_amount
+        origin_price = self.get_ticker_price(origin_coin + "BNB")
+        if origin_price is None:
+            return math.inf
+        return fee_amount * origin_price
+
+    def get_fee(self, origin_coin: str, target_coin: str, selling: bool):
+        if self.config.TLD != "com":
+            return 0.001
+        base_fee = self.get_trade_fees()[origin_coin + target_coin]
+        if not self.get_using_bnb_for_fees():
+            return base_fee
+        fee_amount_bnb = self._get_bnb_fee_amount(origin_coin, target_coin, selling, base_fee)
         bnb_balance = self.get_currency_balance("BNB")
         if bnb_balance >= fee_amount_bnb:
             return base_fee * 0.75
         return base_fee
 
+    def get_fees(self, target_coin: str, selling: bool) -> np.ndarray:
+        coins = CoinStub.get_all()
+        if self.config.TLD != "com":
+            return np.full(len(coins), 0.001)
+        trade_fees = self.get_trade_fees()
+        using_bnb = self.get_using_bnb_for_fees()
+        bnb_balance = self.get_currency_balance("BNB") if using_bnb else 0.0
+        key = (target_coin, using_bnb, bnb_balance, len(coins))
+        cached_fees = self._fee_vectors.get(selling)
+        if cached_fees is None or cached_fees[0] is not trade_fees or cached_fees[1] != key:
+            base_fees = np.array(
+                [trade_fees.get(coin.symbol + target_coin, math.nan) for coin in coins]
+            )
+            # BNB needed to pay each fee at the discounted rate, inf where it can't be priced
+            bnb_fee_amounts = np.array(
+                [
+                    self._get_bnb_fee_amount(coin.symbol, target_coin, selling, base_fee)
+                    if using_bnb and not math.isnan(base_fee)
+                    else math.inf
+                    for coin, base_fee in zip(coins, base_fees.tolist())
+                ]
+            )
+            cached_fees = self._fee_vectors[selling] = (
+                trade_fees,
+                key,
+                base_fees,
+                bnb_fee_amounts,
+            )
+        _, _, base_fees, bnb_fee_amounts = cached_fees
+        if not using_bnb:
+            return base_fees
+        return np.where(bnb_balance >= bnb_fee_amounts, base_fees * 0.75, base_fees)
+
+    def log_depth_stats(self):
+        if self.stream_manager is None:
+            return
+        depth_stats = self.stream_manager.get_depth_stats()
+        totals: dict[str, int] = defaultdict(int)
+        for symbol_stats in depth_stats.values():
+            for name, value in symbol_stats.items():
+                totals[name] += value
+        self.logger.debug(f"Depth cache stats: {dict(totals)}")
+        self.logger.debug(f"Depth cache stats per symbol: {depth_stats}")
+
     def close(self):
         if self.stream_manager:
             self.stream_manager.close()
@@ -1,14 +1,21 @@
 import asyncio
+import math
+import sys
+import time
 import uuid
 from abc import ABC, abstractmethod
-from collections import defaultdict, deque
+from array import array
+from bisect import bisect_left
+from collections import defaultdict, deque, namedtuple
 from collections.abc import Callable
 from concurrent.futures import Future
 from contextlib import asynccontextmanager, contextmanager, suppress
+from functools import partial
 from threading import Event, Lock, Thread
 from types import TracebackType
 from typing import Any, ParamSpec, TypeVar
 
+import numpy as np
 from binance import AsyncClient
 from binance.exceptions import BinanceAPIException
 from sortedcontainers import SortedDict
@@ -20,6 +27,15 @@ from .logger import AbstractLogger
 T = TypeVar("T")
 P = ParamSpec("P")
 
+MARKET_BUY = "BUY"
+MARKET_SELL = "SELL"
+MARKET_SELL_FILL_QUOTE = "SELL_FILL_QUOTE"
+
+# Depth snapshots are rebuilt at most this often (seconds) unless a scout trigger fires
+DEPTH_SNAPSHOT_INTERVAL = 0.25
+
+MarketPriceRequest = namedtuple("MarketPriceRequest", ["symbol", "side", "amount"])
+
 
 class ThreadSafeAsyncLock:
     def __init__(self):
@@ -82,10 +98,19 @@ class BinanceCache:
         self._balances_mutex: ThreadSafeAsyncLock = ThreadSafeAsyncLock()
         self.non_existent_tickers: set[str] = set()
         self.balances_changed_event = Event()
+        self.depth_changed_event = Event()
+        self.trigger_prices: dict[str, tuple[float, float]] | None = None
 
     def attach_loop(self):
         self._balances_mutex.attach_loop()
 
+    def is_depth_trigger(self, symbol: str, best_bid: float, best_ask: float) -> bool:
+        trigger_prices = self.trigger_prices
+        if trigger_prices is None:
+            return True
+        ask_below, bid_above = trigger_prices.get(symbol, (0.0, math.inf))
+        return best_ask < ask_below or best_bid > bid_above
+
     @contextmanager
     def open_balances(self):
         with self._balances_mutex:
@@ -97,52 +122,327 @@ class BinanceCache:
             yield self._balances
 
 
-class DepthCache:
-    def __init__(self, keep_limit: int = 200, max_size: int = 400):
-        self.bids = SortedDict()
-        self.asks = SortedDict()
-        self.keep_limit = keep_limit
-        self.max_size = max_size
+def step_precision(step: str) -> int:
+    return len(step.partition(".")[2].rstrip("0"))
 
-    def add_bid(self, bid: list[float]):
-        price = float(bid[0])
-        amount = self.bids[price] = float(bid[1])
-        if amount == 0:
-            del self.bids[price]
-        elif len(self.bids) >= self.max_size:
-            self.bids = SortedDict({k: self.bids[k] for k in self.bids.keys()[-self.keep_limit :]})
 
-    def add_ask(self, ask: list[float]):
-        price = float(ask[0])
-        amount = self.asks[price] = float(ask[1])
+def to_ticks(value: str, precision: int) -> int:
+    whole, _, fraction = value.partition(".")
+    fraction, rest = fraction[:precision].ljust(precision, "0"), fraction[precision:]
+    if rest.strip("0"):
+        raise ValueError(f"{value} is not a whole number of ticks at {precision} decimals")
+    return int(whole + fraction)
+
+
+def book_bytes(book: SortedDict) -> int:
+    # The dict and the sorted key lists hold the same price objects, so they are counted once
+    sorted_keys = book._list
+    return (
+        sys.getsizeof(book)
+        + sys.getsizeof(sorted_keys._lists)
+        + sum(map(sys.getsizeof, sorted_keys._lists))
+        + sys.getsizeof(sorted_keys._maxes)
+        + sys.getsizeof(sorted_keys._index)
+        + sum(sys.getsizeof(price) + sys.getsizeof(amount) for price, amount in book.items())
+    )
+
+
+class FloatBook:
+    __slots__ = ("levels",)
+
+    def __init__(self):
+        self.levels = SortedDict()
+
+    def __len__(self):
+        return len(self.levels)
+
+    def set(self, price: float, amount: float):
         if amount == 0:
-            del self.asks[price]
-        elif len(self.asks) >= self.max_size:
-            self.asks = SortedDict({k: self.asks[k] for k in self.asks.keys()[: self.keep_limit]})
+            self.levels.pop(price, None)
+        else:
+            self.levels[price] = amount
+
+    def trim_low(self, count: int):
+        del self.levels.keys()[:count]
+
+    def trim_high(self, count: int):
+        del self.levels.keys()[len(self.levels) - count :]
+
+    def lowest(self) -> float:
+        return self.levels.peekitem(0)[0] if self.levels else math.nan
+
+    def highest(self) -> float:
+        return self.levels.peekitem(-1)[0] if self.levels else math.nan
+
+    def items(self) -> list[tuple[float, float]]:
+        return list(self.levels.items())
+
+    def ladder_levels(self, descending: bool) -> tuple[tuple[float, float], ...]:
+        return tuple(reversed(self.levels.items()) if descending else self.levels.items())
+
+    def nbytes(self) -> int:
+        return book_bytes(self.levels)
+
+    def clear(self):
+        self.levels.clear()
+
+
+class TickBook:
+    __slots__ = ("prices", "amounts")
+
+    def __init__(self):
+        # Sorted ascending, like the SortedDict of FloatBook, as two packed int64 arrays
+        self.prices = array("q")
+        self.amounts = array("q")
+
+    def __len__(self):
+        return len(self.prices)
+
+    def set(self, price: int, amount: int):
+        prices = self.prices
+        i = bisect_left(prices, price)
+        if i < len(prices) and prices[i] == price:
+            if amount != 0:
+                self.amounts[i] = amount
+            else:
+                del prices[i]
+                del self.amounts[i]
+        elif amount != 0:
+            prices.insert(i, price)
+            self.amounts.insert(i, amount)
+
+    def trim_low(self, count: int):
+        del self.prices[:count]
+        del self.amounts[:count]
+
+    def trim_high(self, count: int):
+        del self.prices[len(self.prices) - count :]
+        del self.amounts[len(self.amounts) - count :]
+
+    def lowest(self) -> float:
+        return self.prices[0] if self.prices else math.nan
+
+    def highest(self) -> float:
+        return self.prices[-1] if self.prices else math.nan
+
+    def items(self) -> list[tuple[int, int]]:
+        return list(zip(self.prices, self.amounts))
+
+    def ladder_levels(self, descending: bool) -> np.ndarray:
+        levels = np.column_stack((np.array(self.prices), np.array(self.amounts)))
+        return levels[::-1] if descending else levels
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.prices) + sys.getsizeof(self.amounts)
+
+    def clear(self):
+        del self.prices[:]
+        del self.amounts[:]
+
+
+class PriceLadder:
+    __slots__ = ("levels", "price_scale", "amount_scale", "_arrays")
+
+    def __init__(
+        self,
+        levels: tuple[tuple[float, float], ...] | np.ndarray,
+        price_scale: int = 1,
+        amount_scale: int = 1,
+    ):
+        self.levels = levels
+        self.price_scale = price_scale
+        self.amount_scale = amount_scale
+        self._arrays: tuple[np.ndarray, np.ndarray, np.ndarray] | None = None
+
+    def __len__(self):
+        return len(self.levels)
+
+    def _get_arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        arrays = self._arrays
+        if arrays is None:
+            ladder = np.array(self.levels, dtype=np.float64).reshape(-1, 2)
+            prices = ladder[:, 0] / self.price_scale
+            amounts = ladder[:, 1] / self.amount_scale
+            arrays = self._arrays = (prices, np.cumsum(amounts), np.cumsum(prices * amounts))
+        return arrays
+
+    def fill_amount(self, amount: float):
+        if abs(amount) <= 1e-15:
+            return 0.0, 0.0
+        prices, cum_amounts, cum_quotes = self._get_arrays()
+        i = int(cum_amounts.searchsorted(amount))
+        if i == len(prices):
+            if i == 0 or amount - cum_amounts[-1] > 1e-15:
+                return None, None
+            i -= 1
+        filled_amount = cum_amounts[i - 1] if i > 0 else 0.0
+        filled_quote = cum_quotes[i - 1] if i > 0 else 0.0
+        quote = float(filled_quote + (amount - filled_amount) * prices[i])
+        return quote / amount, quote
+
+    def fill_quote(self, quote: float):
+        if abs(quote) <= 1e-15:
+            return 0.0, 0.0
+        prices, cum_amounts, cum_quotes = self._get_arrays()
+        i = int(cum_quotes.searchsorted(quote))
+        if i == len(prices):
+            if i == 0 or quote - cum_quotes[-1] > 1e-15:
+                return None, None
+            i -= 1
+        filled_amount = cum_amounts[i - 1] if i > 0 else 0.0
+        filled_quote = cum_quotes[i - 1] if i > 0 else 0.0
+        amount = float(filled_amount + (quote - filled_quote) / prices[i])
+        return quote / amount, amount
+
+
+class DepthCache:
+    def __init__(
+        self,
+        keep_limit: int = 200,
+        max_size: int = 400,
+        price_precision: int | None = None,
+        amount_precision: int | None = None,
+    ):
+        self.keep_limit = keep_limit
+        self.max_size = max_size
+        self.tick_mode = price_precision is not None and amount_precision is not None
+        self.price_scale = 10**price_precision if self.tick_mode else 1
+        self.amount_scale = 10**amount_precision if self.tick_mode else 1
+        self._parse_price: Callable[[str], float | int] = (
+            partial(to_ticks, precision=price_precision) if self.tick_mode else float
+        )
+        self._parse_amount: Callable[[str], float | int] = (
+            partial(to_ticks, precision=amount_precision) if self.tick_mode else float
+        )
+        book_type = TickBook if self.tick_mode else FloatBook
+        self.bids: FloatBook | TickBook = book_type()
+        self.asks: FloatBook | TickBook = book_type()
+        self._bid_ladder: PriceLadder | None = None
+        self._ask_ladder: PriceLadder | None = None
+        self.trims = 0
+        self.evicted_levels = 0
+
+    def disable_tick_mode(self):
+        bids, asks = FloatBook(), FloatBook()
+        for book, levels in ((bids, self.bids.items()), (asks, self.asks.items())):
+            for price, amount in levels:
+                book.set(price / self.price_scale, amount / self.amount_scale)
+        self.bids, self.asks = bids, asks
+        self.tick_mode = False
+        self.price_scale = self.amount_scale = 1
+        self._parse_price = self._parse_amount = float
+        self._bid_ladder = self._ask_ladder = None
+
+    def add_bid(self, bid: list[str]):
+        self._bid_ladder = None
+        self.bids.set(self._parse_price(bid[0]), self._parse_amount(bid[1]))
+        if len(self.bids) >= self.max_size:
+            evicted = len(self.bids) - self.keep_limit
+            self.bids.trim_low(evicted)
+            self.trims += 1
+            self.evicted_levels += evicted
+
+    def add_ask(self, ask: list[str]):
+        self._ask_ladder = None
+        self.asks.set(self._parse_price(ask[0]), self._parse_amount(ask[1]))
+        if len(self.asks) >= self.max_size:
+            evicted = len(self.asks) - self.keep_limit
+            self.asks.trim_high(evicted)
+            self.trims += 1
+            self.evicted_levels += evicted
 
     def get_bids(self) -> list[list[float]]:
         return reversed(self.bids.items())  # type: ignore
 
     def get_asks(self) -> list[list[float]]:
-        return self.asks.items()
+        return self.asks.items()  # type: ignore
+
+    def get_best_bid(self) -> float:
+        return self.bids.highest() / self.price_scale
+
+    def get_best_ask(self) -> float:
+        return self.asks.lowest() / self.price_scale
+
+    def get_bid_ladder(self) -> PriceLadder:
+        if self._bid_ladder is None:
+            self._bid_ladder = PriceLadder(
+                self.bids.ladder_levels(descending=True), self.price_scale, self.amount_scale
+            )
+        return self._bid_ladder
+
+    def get_ask_ladder(self) -> PriceLadder:
+        if self._ask_ladder is None:
+            self._ask_ladder = PriceLadder(
+                self.asks.ladder_levels(descending=False), self.price_scale, self.amount_scale
+            )
+        return self._ask_ladder
 
     def clear(self):
         self.bids.clear()
         self.asks.clear()
+        self._bid_ladder = None
+        self._ask_ladder = None
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            "bid_levels": len(self.bids),
+            "ask_levels": len(self.asks),
+            "book_bytes": self.bids.nbytes() + self.asks.nbytes(),
+            "trims": self.trims,
+            "evicted_levels": self.evicted_levels,
+        }
+
+
+class DepthSnapshot:
+    __slots__ = ("version", "bids", "asks")
+
+    def __init__(self, version: int, bids: PriceLadder, asks: PriceLadder):
+        self.version = version
+        self.bids = bids
+        self.asks = asks
+
+    def __repr__(self):
+        return f"<DepthSnapshot v{self.version} bids={len(self.bids)} asks={len(self.asks)}>"
+
+    def get_market_sell_price_fill_quote(self, quote: float):
+        return self.bids.fill_quote(quote)
+
+    def get_market_sell_price(self, amount: float):
+        return self.bids.fill_amount(amount)
+
+    def get_market_buy_price(self, quote_amount: float):
+        return self.asks.fill_quote(quote_amount)
 
 
 class DepthCacheManager:
-    def __init__(self, symbol: str, client: AsyncClient, logger: AbstractLogger, limit: int = 100):
+    def __init__(
+        self,
+        symbol: str,
+        client: AsyncClient,
+        logger: AbstractLogger,
+        limit: int = 100,
+        price_precision: int | None = None,
+        amount_precision: int | None = None,
+        cache: BinanceCache | None = None,
+    ):
         self.id = uuid.uuid4()
         self.pending_signals_counter = 0
         self.pending_reinit = False
         self.data_queue: deque = deque()
         self.symbol = symbol
-        self.depth_cache = DepthCache()
+        self.depth_cache = DepthCache(
+            price_precision=price_precision, amount_precision=amount_precision
+        )
         self.client = client
         self.limit = limit
         self.last_update_id = -1
         self.logger = logger
+        self.cache = cache
+        self.snapshot = DepthSnapshot(0, PriceLadder(()), PriceLadder(()))
+        self._published_at = 0.0
+        self._publish_handle: asyncio.TimerHandle | None = None
+        self.updates = 0
+        self.update_ns = 0
 
     # XXX: Improve logging semantics
     async def _handle_data(self, data: dict[str, Any]):
@@ -156,6 +456,7 @@ class DepthCacheManager:
             return
         self.apply_orders(data)
         self.last_update_id = data["final_update_id_in_event"]
+        self.publish()
 
     def buffer_incoming_data(self):
         return self.pending_signals_counter > 0 or self.pending_reinit
@@ -169,16 +470,67 @@ class DepthCacheManager:
             await self._handle_data(pop_data)
         await self._handle_data(data)
 
-    def apply_orders(self, msg: dict[str, Any]):
+    def _add_levels(self, msg: dict[str, Any]):
         for bid in msg["bids"]:
             self.depth_cache.add_bid(bid)
         for ask in msg["asks"]:
             self.depth_cache.add_ask(ask)
 
+    def apply_orders(self, msg: dict[str, Any]):
+        start = time.perf_counter_ns()
+        try:
+            self._add_levels(msg)
+        except ValueError as e:
+            if not self.depth_cache.tick_mode:
+                raise
+            # The tick or step size changed since the filters were read, levels are idempotent
+            # so the whole message is simply applied again
+            self.logger.warning(f"OB: {self.symbol} {e}, falling back to float prices")
+            self.depth_cache.disable_tick_mode()
+            self._add_levels(msg)
+        self.update_ns += time.perf_counter_ns() - start
+        self.updates += 1
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            **self.depth_cache.get_stats(),
+            "updates": self.updates,
+            "update_ns": self.update_ns,
+        }
+
+    def _swap_snapshot(self):
+        if self._publish_handle is not None:
+            self._publish_handle.cancel()
+            self._publish_handle = None
+        # Readers on other threads only ever pick up a finished snapshot through this assignment
+        self.snapshot = DepthSnapshot(
+            self.snapshot.version + 1,
+            self.depth_cache.get_bid_ladder(),
+            self.depth_cache.get_ask_ladder(),
+        )
+        self._published_at = time.monotonic()
+
+    def publish(self):
+        triggered = self.cache is not None and self.cache.is_depth_trigger(
+            self.symbol, self.depth_cache.get_best_bid(), self.depth_cache.get_best_ask()
+        )
+        delay = self._published_at + DEPTH_SNAPSHOT_INTERVAL - time.monotonic()
+        # A watched trigger wakes the scout, which has to see the book that woke it
+        if delay <= 0 or (triggered and self.cache.trigger_prices is not None):
+            self._swap_snapshot()
+        elif self._publish_handle is None:
+            self._publish_handle = asyncio.get_running_loop().call_later(delay, self._swap_snapshot)
+        if triggered:
+            self.cache.depth_changed_event.set()
+
+    def clear(self):
+        self.depth_cache.clear()
+        self.publish()
+
     # XXX: Improve logging semantics
     async def reinit(self):
         self.pending_reinit = True
-        self.depth_cache.clear()
+        self.clear()
         while True:
             try:
                 res = await self.client.get_order_book(symbol=self.symbol, limit=self.limit)
@@ -189,6 +541,7 @@ class DepthCacheManager:
                 break
         self.apply_orders(res)
         self.last_update_id = res["lastUpdateId"]
+        self.publish()
         self.pending_reinit = False
 
     async def process_signal(self, signal: dict[str, Any]):
@@ -197,7 +550,7 @@ class DepthCacheManager:
             await self.reinit()
         elif signal["type"] == "DISCONNECT":
             self.logger.debug(f"OB: DISCONNECT arrived for symbol {self.symbol}")
-            self.depth_cache.clear()
+            self.clear()
         self.pending_signals_counter -= 1
         assert self.pending_signals_counter >= 0
 
@@ -242,62 +595,6 @@ class AsyncListenerContext:
             self.queues[stream_buffer_name].put(stream_data), self.loop
         )
 
-    async def get_market_sell_price_fill_quote(self, symbol: str, quote: float):
-        depth_cache = self.depth_cache_managers[symbol].depth_cache
-        amount = 0.0
-        unfilled_quote = quote
-        filled = False
-        if abs(quote) <= 1e-15:
-            return 0.0, 0.0
-        for price, bid_amount in reversed(depth_cache.bids.items()):
-            curr_amount = unfilled_quote / price
-            fill = min(bid_amount, curr_amount)
-            amount += fill
-            unfilled_quote -= price * fill
-            if abs(unfilled_quote) <= 1e-15:
-                filled = True
-                break
-        if not filled:
-            return None, None
-        return quote / amount, amount
-
-    async def get_market_sell_price(self, symbol: str, amount: float):
-        depth_cache = self.depth_cache_managers[symbol].depth_cache
-        quote = 0.0
-        unfilled_amount = amount
-        filled = False
-        if abs(amount) <= 1e-15:
-            return 0.0, 0.0
-        for price, bid_amount in reversed(depth_cache.bids.items()):
-            fill = min(bid_amount, unfilled_amount)
-            quote += price * fill
-            unfilled_amount -= fill
-            if abs(unfilled_amount) <= 1e-15:
-                filled = True
-                break
-        if not filled:
-            return None, None
-        return quote / amount, quote
-
-    async def get_market_buy_price(self, symbol: str, quote_amount: float):
-        depth_cache = self.depth_cache_managers[symbol].depth_cache
-        amount = 0.0
-        unfilled_quote = quote_amount
-        filled = False
-        if abs(quote_amount) <= 1e-15:
-            return 0.0, 0.0
-        for price, ask_amount in depth_cache.asks.items():
-            curr_amount = unfilled_quote / price
-            fill = min(curr_amount, ask_amount)
-            amount += fill
-            unfilled_quote -= fill * price
-            if abs(unfilled_quote) <= 1e-15:
-                filled = True
-                break
-        if not filled:
-            return None, None
-        return quote_amount / amount, amount
-
     def add_signal_data(self, signal_data: dict[str, Any]):
         if self.stopped:
             return
@@ -477,25 +774,55 @@ class BinanceStreamManager:
         self.async_context: AsyncListenerContext = async_context
         self.execution_thread = execution_thread
 
-    def get_market_sell_price(self, symbol: str, amount: float):
+    def get_depth_stats(self) -> dict[str, dict[str, int]]:
+        async def _get_depth_stats():
+            return {
+                symbol: dcm.get_stats()
+                for symbol, dcm in self.async_context.depth_cache_managers.items()
+            }
+
+        # The books are only consistent between updates, on the loop that applies them
         return asyncio.run_coroutine_threadsafe(
-            self.async_context.get_market_sell_price(symbol, amount), self.async_context.loop
+            _get_depth_stats(), self.async_context.loop
         ).result()
 
+    def get_depth_versions(self, symbols: list[str]) -> np.ndarray:
+        dcms = self.async_context.depth_cache_managers
+        return np.fromiter(
+            (dcms[symbol].snapshot.version for symbol in symbols), np.int64, len(symbols)
+        )
+
+    def get_depth_snapshot(self, symbol: str) -> DepthSnapshot:
+        return self.async_context.depth_cache_managers[symbol].snapshot
+
+    def get_market_sell_price(self, symbol: str, amount: float):
+        return self.get_depth_snapshot(symbol).get_market_sell_price(amount)
+
     def get_market_buy_price(self, symbol: str, quote_amount: float):
-        return asyncio.run_coroutine_threadsafe(
-            self.async_context.get_market_buy_price(symbol, quote_amount),
-            self.async_context.loop,
-        ).result()
+        return self.get_depth_snapshot(symbol).get_market_buy_price(quote_amount)
 
     def close(self):
         self.bwam.stop_manager_with_all_streams()
 
     def get_market_sell_price_fill_quote(self, symbol: str, quote_amount: float):
-        return asyncio.run_coroutine_threadsafe(
-            self.async_context.get_market_sell_price_fill_quote(symbol, quote_amount),
-            self.async_context.loop,
-        ).result()
+        return self.get_depth_snapshot(symbol).get_market_sell_price_fill_quote(quote_amount)
+
+    def get_market_prices(
+        self, requests: list[MarketPriceRequest]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        handlers = {
+            MARKET_BUY: DepthSnapshot.get_market_buy_price,
+            MARKET_SELL: DepthSnapshot.get_market_sell_price,
+            MARKET_SELL_FILL_QUOTE: DepthSnapshot.get_market_sell_price_fill_quote,
+        }
+        prices = np.full(len(requests), np.nan)
+        fills = np.full(len(requests), np.nan)
+        for i, (symbol, side, amount) in enumerate(requests):
+            price, fill = handlers[side](self.get_depth_snapshot(symbol), amount)
+            if price is not None:
+                prices[i] = price
+                fills[i] = fill
+        return prices, fills
 
 
 class AutoReplacingStream(LoopExecutor):
@@ -566,8 +893,23 @@ class StreamManagerWorker(Thread):
         depth_markets = [
             coin.lower() + self.config.BRIDGE.symbol.lower() for coin in self.config.WATCHLIST
         ]
+        precisions: dict[str, dict[str, int]] = {}
+        if self.config.DEPTH_TICK_MODE:
+            exchange_info = await client.get_exchange_info()
+            for symbol_info in exchange_info["symbols"]:
+                filters = {f["filterType"]: f for f in symbol_info["filters"]}
+                precisions[symbol_info["symbol"]] = {
+                    "price_precision": step_precision(filters["PRICE_FILTER"]["tickSize"]),
+                    "amount_precision": step_precision(filters["LOT_SIZE"]["stepSize"]),
+                }
         depth_cache_managers = {
-            symbol.upper(): DepthCacheManager(symbol.upper(), client, self.logger)
+            symbol.upper(): DepthCacheManager(
+                symbol.upper(),
+                client,
+                self.logger,
+                cache=self.cache,
+                **precisions.get(symbol.upper(), {}),
+            )
             for symbol in depth_markets
         }
         async_context = AsyncListenerContext(
@@ -1,5 +1,6 @@
 # mypy: disable-error-code=call-arg
 import os
+from typing import Literal
 
 from pydantic_settings import BaseSettings
 
@@ -15,8 +16,14 @@ class Settings(BaseSettings):
     SCOUT_HISTORY_PRUNE_TIME: float = 1
     SCOUT_MULTIPLIER: float = 5
     SCOUT_SLEEP_TIME: int = 1
+    SCOUT_MODE: Literal["poll", "event"] = "poll"
+    SCOUT_MIN_INTERVAL: float = 0.2
+    SCOUT_FALLBACK_TIME: int = 60
+    SCOUT_JUMP_SEARCH: Literal["greedy", "graph"] = "greedy"
+    SCOUT_MAX_HOPS: int = 3
     USE_MARGIN: bool = True
     SCOUT_MARGIN: float = 0.8
+    SCOUT_QUOTE_TOLERANCE: float = 0.001
     BINANCE_API_KEY: str
     BINANCE_API_SECRET_KEY: str
     TLD: str = "com"
@@ -24,6 +31,14 @@ class Settings(BaseSettings):
     STRATEGY: str = "default"
     ENABLE_PAPER_TRADING: bool
     PAPER_WALLET_BALANCE: float = 10_000
+    DEPTH_TICK_MODE: bool = False
+    RATIO_STORE: bool = False
+    RATIO_JOURNAL: bool = False
+    RATIO_SYNC_TIME: int = 60
+    DB_WRITE_QUEUE_SIZE: int = 1000
+    DB_PROFILE: Literal["default", "wal", "wal_durable"] = "default"
+    DB_POOL_SIZE: int = 5
+    API_UPDATE_QUEUE_SIZE: int = 1000
 
 
 settings = Settings(_env_file=ENV_PATH_NAME, _env_file_encoding="utf-8")
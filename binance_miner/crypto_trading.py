@@ -8,7 +8,7 @@ from .binance import BinanceAPIManager
 from .config import Config
 from .database import Database
 from .logger import Logger
-from .scheduler import SafeScheduler
+from .scheduler import EventTrigger, SafeScheduler
 from .strategies import get_strategy
 
 
@@ -37,6 +37,7 @@ def main():
         thread = Thread(target=manager.close)
         thread.start()
         thread.join(timeout)
+        db.close()
 
     def exit_handler(*args):
         nonlocal exiting
@@ -67,6 +68,7 @@ def main():
     # Create database
     logger.info("Creating database schema if it doesn't already exist")
     db.create_database()
+    db.log_query_plans()
 
     # Set watchlist and initialize autotrader
     db.set_coins(config.WATCHLIST)
@@ -75,12 +77,25 @@ def main():
 
     # Initialize scheduler
     schedule = SafeScheduler(logger)
-    schedule.every(config.SCOUT_SLEEP_TIME).seconds.do(trader.scout)
+    event_scout = None
+    if config.SCOUT_MODE == "event":
+        event_scout = EventTrigger(
+            logger, manager.wait_for_depth_update, trader.scout, config.SCOUT_MIN_INTERVAL
+        )
+        logger.info("Will be scouting on order book updates")
+        schedule.every(config.SCOUT_FALLBACK_TIME).seconds.do(trader.scout)
+    else:
+        schedule.every(config.SCOUT_SLEEP_TIME).seconds.do(trader.scout)
     schedule.every().minutes.do(trader.update_values)
     schedule.every().minutes.do(db.prune_scout_history)
     schedule.every().hours.do(db.prune_value_history)
+    schedule.every(config.RATIO_SYNC_TIME).seconds.do(db.sync_ratios)
+    schedule.every().minutes.do(manager.log_depth_stats)
 
     # Initiate scheduler loop
     while not exiting:
         schedule.run_pending()
-        time.sleep(1)
+        if event_scout is not None:
+            event_scout.run_pending(timeout=1)
+        else:
+            time.sleep(1)
@@ -1,20 +1,61 @@
 # https://docs.sqlalchemy.org/en/20/orm/extensions/mypy.html
 # mypy: disable-error-code="arg-type, assignment"
-import time
+import uuid
 from collections import namedtuple
+from collections.abc import Callable
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Any
 
 from dateutil.relativedelta import relativedelta
-from socketio import Client, exceptions
-from sqlalchemy import bindparam, create_engine, func, insert, select, update
+from sqlalchemy import bindparam, delete, event, func, insert, inspect, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine, create_engine, make_url
 from sqlalchemy.orm import Session, scoped_session, sessionmaker
+from sqlalchemy.schema import MetaData, Table
+from sqlalchemy.sql import Subquery, union_all
 
 from . import models
 from .config import Config
+from .db_writer import DatabaseWrite, DatabaseWriter
 from .logger import AbstractLogger
 from .postpone import heavy_call
+from .ratio_journal import RatioJournal
+from .ratio_store import RatioStore
 from .ratios import CoinStub, RatiosManager
+from .update_publisher import UpdatePublisher
+
+SQLITE_PROFILES: dict[str, dict[str, str | int]] = {
+    "default": {},
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "busy_timeout": 10000,
+    },
+    "wal_durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "busy_timeout": 10000,
+    },
+}
+
+ROLLUP_BUCKETS: dict[models.Interval, Callable[[datetime], datetime]] = {
+    models.Interval.HOURLY: lambda dt: dt.replace(minute=0, second=0, microsecond=0),
+    models.Interval.DAILY: lambda dt: dt.replace(hour=0, minute=0, second=0, microsecond=0),
+    models.Interval.WEEKLY: lambda dt: (dt - timedelta(days=dt.weekday())).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    ),
+}
+ROLLUP_BATCH_SIZE = 10000
+ROLLUP_RETENTION = {
+    models.Interval.HOURLY: relativedelta(months=1),
+    models.Interval.DAILY: relativedelta(years=1),
+}
 
 LogScout = namedtuple(
     "LogScout", ["pair_id", "ratio_diff", "target_ratio", "coin_price", "optional_coin_price"]
@@ -23,14 +64,30 @@ LogScout = namedtuple(
 
 class Database:
     DB = "sqlite:///data/crypto_trading.sqlite3"
+    RATIO_STORE_PATH: str | None = "data/ratios.bin"
+    RATIO_JOURNAL_PATH: str | None = "data/ratios.journal"
+    WRITE_BEHIND = True
+    API_URL: str | None = "http://api:5000"
 
     def __init__(self, logger: AbstractLogger, config: Config):
         self.logger = logger
         self.config = config
-        self.engine = create_engine(self.DB, future=True)
+        self.engine = self._create_engine()
         self.session_factory = scoped_session(sessionmaker(self.engine))
-        self.socketio_client = Client()
+        self.publisher = (
+            UpdatePublisher(logger, self.API_URL, config.API_UPDATE_QUEUE_SIZE)
+            if self.API_URL is not None
+            else None
+        )
+        self.writer = DatabaseWriter(logger, self.engine, config.DB_WRITE_QUEUE_SIZE)
         self.ratios_manager: RatiosManager | None = None
+        self.ratio_store: RatioStore | None = None
+        self.ratio_journal: RatioJournal | None = None
+        self._unsynced_ratios: set[tuple[int, int]] = set()
+        self._full_ratio_sync = False
+        self.scout_partitions = MetaData()
+        self._scout_partitions_lock = Lock()
+        self._created_scout_partitions: set[str] = set()
 
     @contextmanager
     def db_session(self):
@@ -39,58 +96,181 @@ class Database:
         session.commit()
         session.close()
 
-    def _api_session(self):
-        if self.socketio_client.connected and self.socketio_client.namespaces:
-            return True
-        try:
-            if not self.socketio_client.connected:
-                self.socketio_client.connect(
-                    "http://api:5000", socketio_path="/ws/socket.io", namespaces=["/backend"]
-                )
-            while not self.socketio_client.connected or not self.socketio_client.namespaces:
-                time.sleep(0.1)
-            return True
-        except exceptions.ConnectionError:
-            return False
+    def _create_engine(self) -> Engine:
+        url = make_url(self.DB)
+        if url.database in (None, "", ":memory:"):
+            return create_engine(url, future=True)
+        engine = create_engine(url, future=True, pool_size=self.config.DB_POOL_SIZE)
+        pragmas = SQLITE_PROFILES[self.config.DB_PROFILE]
+
+        @event.listens_for(engine, "connect")
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma, value in pragmas.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+            cursor.close()
+
+        return engine
+
+    def write(self, write: DatabaseWrite):
+        if not self.WRITE_BEHIND:
+            with self.db_session() as session:
+                write(session)
+            return
+        self.writer.submit(write)
+
+    def flush_writes(self):
+        self.writer.flush()
+
+    def get_writer_stats(self) -> dict[str, int]:
+        return self.writer.get_stats()
+
+    def close(self):
+        self.writer.close()
+        self.logger.debug(f"Database writer stats: {self.writer.get_stats()}")
+        if self.publisher is not None:
+            self.publisher.close()
+            self.logger.debug(f"Update publisher stats: {self.publisher.get_stats()}")
 
     def set_coins(self, symbols: list[str]):
+        coin_t = models.Coin.__table__
+        pair_t = models.Pair.__table__
         session: Session
         with self.db_session() as session:
-            coins: list[models.Coin] = session.query(models.Coin).all()
-            for coin in coins:
-                if coin.symbol not in symbols:
-                    coin.enabled = False
-            for symbol in symbols:
-                coin = next((coin for coin in coins if coin.symbol == symbol), None)
-                if coin is None:
-                    session.add(models.Coin(symbol))
-                else:
-                    coin.enabled = True
+            existing_coins = set(session.execute(select(coin_t.c.symbol)).scalars())
+            session.execute(update(coin_t).values(enabled=coin_t.c.symbol.in_(symbols)))
+            new_coins = [
+                symbol for symbol in dict.fromkeys(symbols) if symbol not in existing_coins
+            ]
+            if new_coins:
+                session.execute(
+                    insert(coin_t), [{"symbol": symbol, "enabled": True} for symbol in new_coins]
+                )
         CoinStub.reset()
         with self.db_session() as session:
-            coins = (
-                session.query(models.Coin)
-                .filter(models.Coin.enabled)
-                .order_by(models.Coin.symbol)
+            enabled_coins = (
+                session.execute(
+                    select(coin_t.c.symbol).where(coin_t.c.enabled).order_by(coin_t.c.symbol)
+                )
+                .scalars()
                 .all()
             )
-            for coin in coins:
-                CoinStub.create(coin.symbol)
-            for from_coin in coins:
-                for to_coin in coins:
-                    if from_coin != to_coin:
-                        pair = (
-                            session.query(models.Pair)
-                            .filter(
-                                models.Pair.from_coin == from_coin, models.Pair.to_coin == to_coin
-                            )
-                            .first()
-                        )
-                        if pair is None:
-                            session.add(models.Pair(from_coin, to_coin))
+            for symbol in enabled_coins:
+                CoinStub.create(symbol)
+            existing_pairs = set(
+                session.execute(select(pair_t.c.from_coin_id, pair_t.c.to_coin_id)).tuples()
+            )
+            missing_pairs = [
+                {"from_coin_id": from_symbol, "to_coin_id": to_symbol}
+                for from_symbol in enabled_coins
+                for to_symbol in enabled_coins
+                if from_symbol != to_symbol and (from_symbol, to_symbol) not in existing_pairs
+            ]
+            if missing_pairs:
+                session.execute(insert(pair_t), missing_pairs)
+            token_t = models.PairIdToken.__table__
+            if missing_pairs or session.execute(select(token_t.c.token)).first() is None:
+                session.execute(delete(token_t))
+                session.execute(insert(token_t).values(token=uuid.uuid4().hex))
+        self._load_ratios()
+
+    def _load_ratios(self):
+        if self.config.RATIO_STORE and self.RATIO_STORE_PATH is not None:
+            self._load_ratio_store()
+            return
+        if self.config.RATIO_JOURNAL and self.RATIO_JOURNAL_PATH is not None:
+            self._open_ratio_journal()
+        self.ratios_manager = self._load_pair_ratios()
+
+    def _load_pair_ratios(self) -> RatiosManager:
+        self.flush_writes()
+        session: Session
+        coin_t = models.Coin.__table__
+        pair_t = models.Pair.__table__
+        from_coin_t = coin_t.alias()
+        to_coin_t = coin_t.alias()
+        with self.db_session() as session:
+            pairs = session.execute(
+                select(pair_t.c.id, pair_t.c.from_coin_id, pair_t.c.to_coin_id, pair_t.c.ratio)
+                .join(from_coin_t, from_coin_t.c.symbol == pair_t.c.from_coin_id)
+                .join(to_coin_t, to_coin_t.c.symbol == pair_t.c.to_coin_id)
+                .where(from_coin_t.c.enabled, to_coin_t.c.enabled)
+            ).tuples()
+            return RatiosManager(pairs)
+
+    def _get_pair_ids(self, symbols: list[str]) -> dict[tuple[str, str], int]:
+        session: Session
+        pair_t = models.Pair.__table__
         with self.db_session() as session:
-            pairs = session.query(models.Pair).filter(models.Pair.enabled.is_(True)).all()
-            self.ratios_manager = RatiosManager(pairs)
+            pairs = session.execute(
+                select(pair_t.c.from_coin_id, pair_t.c.to_coin_id, pair_t.c.id).where(
+                    pair_t.c.from_coin_id.in_(symbols), pair_t.c.to_coin_id.in_(symbols)
+                )
+            )
+            return {(from_symbol, to_symbol): pair_id for from_symbol, to_symbol, pair_id in pairs}
+
+    def _get_pair_id_token(self) -> bytes:
+        session: Session
+        token_t = models.PairIdToken.__table__
+        with self.db_session() as session:
+            return bytes.fromhex(session.execute(select(token_t.c.token)).scalar_one())
+
+    def _load_ratio_store(self):
+        if self.ratio_store is not None:
+            self.sync_ratios()
+            self.ratio_store.close()
+        store = RatioStore(self.RATIO_STORE_PATH)
+        token = self._get_pair_id_token()
+        if store.open(token):
+            self.ratios_manager = store.load()
+            self._full_ratio_sync = True
+        else:
+            # Coin list changed or the database was recreated: carry over the stored ratios of the
+            # pairs that still have the same ids before rebuilding the matrix
+            if store.open_existing():
+                pair_ids = self._get_pair_ids(store.symbols)
+                valid_ids = {
+                    pair_id
+                    for pair, pair_id in store.get_pair_ids().items()
+                    if pair_ids.get(pair) == pair_id
+                }
+                self._update_pair_ratios(
+                    [
+                        (pair_id, ratio)
+                        for pair_id, ratio in store.get_cells()
+                        if pair_id in valid_ids
+                    ]
+                )
+            self.ratios_manager = self._load_pair_ratios()
+            store.save(self.ratios_manager, token)
+        self.ratio_store = store
+
+    def _open_ratio_journal(self):
+        if self.ratio_journal is not None:
+            self.sync_ratios()
+        journal = self.ratio_journal or RatioJournal(self.RATIO_JOURNAL_PATH)
+        cells = journal.replay()
+        if cells:
+            self.logger.info(f"Replaying {len(cells)} journaled ratio updates")
+            pair_t = models.Pair.__table__
+            stmt = (
+                pair_t.update()
+                .where(
+                    pair_t.c.from_coin_id == bindparam("from_symbol"),
+                    pair_t.c.to_coin_id == bindparam("to_symbol"),
+                )
+                .values(ratio=bindparam("pair_ratio"))
+            )
+            with self.db_session() as session:
+                session.execute(
+                    stmt,
+                    [
+                        {"from_symbol": from_symbol, "to_symbol": to_symbol, "pair_ratio": ratio}
+                        for from_symbol, to_symbol, ratio in cells
+                    ],
+                )
+        journal.reset([coin.symbol for coin in CoinStub.get_all()])
+        self.ratio_journal = journal
 
     def get_coins(self, only_enabled: bool = True) -> list[models.Coin]:
         session: Session
@@ -119,7 +299,7 @@ class Database:
                 coin = session.merge(coin)
             cc = models.CurrentCoin(coin)
             session.add(cc)
-            self.send_update(cc)
+            self.send_update(session, cc)
 
     def get_current_coin(self) -> models.Coin | None:
         session: Session
@@ -146,98 +326,284 @@ class Database:
             session.expunge(pair)
             return pair
 
+    def _scout_partition(self, dt: datetime) -> Table:
+        # The trader, the writer and the scheduler all look partitions up in the same MetaData
+        with self._scout_partitions_lock:
+            return models.scout_history_partition(
+                dt.replace(minute=0, second=0, microsecond=0), self.scout_partitions
+            )
+
+    def _get_scout_partitions(self) -> dict[datetime, Table]:
+        with self.engine.connect() as connection:
+            names = inspect(connection).get_table_names()
+        partitions = {}
+        for name in names:
+            start = models.parse_scout_partition(name)
+            if start is not None:
+                partitions[start] = self._scout_partition(start)
+        return partitions
+
     # FIXME: self.send_update
     @heavy_call
     def batch_log_scout(self, logs: list[LogScout]):
-        session: Session
-        with self.db_session() as session:
-            dt = datetime.now()
-            session.execute(
-                insert(models.ScoutHistory),
-                [
-                    {
-                        "pair_id": ls.pair_id,
-                        "ratio_diff": ls.ratio_diff,
-                        "target_ratio": ls.target_ratio,
-                        "current_coin_price": ls.coin_price,
-                        "other_coin_price": ls.optional_coin_price,
-                        "dt": dt,
-                    }
-                    for ls in logs
-                ],
-            )
+        dt = datetime.now()
+        partition = self._scout_partition(dt)
+        rows = [
+            {
+                "pair_id": ls.pair_id,
+                "ratio_diff": ls.ratio_diff,
+                "target_ratio": ls.target_ratio,
+                "current_coin_price": ls.coin_price,
+                "other_coin_price": ls.optional_coin_price,
+                "dt": dt,
+            }
+            for ls in logs
+        ]
+
+        def _log_scout(session: Session):
+            if partition.name not in self._created_scout_partitions:
+                partition.create(session.connection(), checkfirst=True)
+                # A failed group commit rolls the CREATE TABLE back along with the rows
+                event.listen(
+                    session,
+                    "after_commit",
+                    lambda _: self._created_scout_partitions.add(partition.name),
+                    once=True,
+                )
+            session.execute(insert(partition), rows)
+
+        self.write(_log_scout)
 
     def prune_scout_history(self):
         time_diff = datetime.now() - relativedelta(hours=self.config.SCOUT_HISTORY_PRUNE_TIME)
-        session: Session
-        with self.db_session() as session:
-            session.query(models.ScoutHistory).filter(models.ScoutHistory.dt < time_diff).delete()
+        # Whole hours are dropped at once instead of deleting rows out of a single table
+        expired = [
+            partition
+            for start, partition in self._get_scout_partitions().items()
+            if start + timedelta(hours=1) <= time_diff
+        ]
+        with self.engine.begin() as connection:
+            for partition in expired:
+                self._created_scout_partitions.discard(partition.name)
+                partition.drop(connection, checkfirst=True)
+                with self._scout_partitions_lock:
+                    self.scout_partitions.remove(partition)
+            connection.execute(
+                models.ScoutHistory.__table__.delete().where(models.ScoutHistory.dt < time_diff)
+            )
 
-    def prune_value_history(self):
-        def _datetime_id_query(dt_format):
-            dt_column = func.strftime(dt_format, models.CoinValue.dt)
-            grouped = select(models.CoinValue, func.max(models.CoinValue.dt), dt_column).group_by(
-                models.CoinValue.coin_id, models.CoinValue, dt_column
+    def scout_history_query(self, since: datetime | None) -> Subquery:
+        legacy_t = models.ScoutHistory.__table__
+        sources = [(legacy_t, 0)] + [
+            (partition, int(start.timestamp()) // 3600 << 32)
+            for start, partition in sorted(self._get_scout_partitions().items())
+            if since is None or start + timedelta(hours=1) > since
+        ]
+        queries = []
+        for table, id_offset in sources:
+            # Ids restart in every partition, offsetting them by the hour keeps them unique
+            query = select(
+                (table.c.id + id_offset).label("id"),
+                *(table.c[column.name] for column in legacy_t.c if column.name != "id"),
             )
-            return select(grouped.c.id.label("id")).select_from(grouped)
-
-        def _update_query(datetime_query, interval):
-            return (
-                update(models.CoinValue)
-                .where(models.CoinValue.id.in_(datetime_query))
-                .values(interval=interval)
-                .execution_options(synchronize_session="fetch")
+            if since is not None:
+                query = query.where(table.c.dt > since)
+            queries.append(query)
+        return union_all(*queries).subquery("scout_history_all")
+
+    def _rollup_value_history(self, session: Session) -> int:
+        cv_t = models.CoinValue.__table__
+        rollup_t = models.CoinValueRollup.__table__
+        watermark_t = models.RollupWatermark.__table__
+        watermarks = dict(
+            session.execute(select(watermark_t.c.interval, watermark_t.c.last_id)).all()
+        )
+        last_id = min(watermarks.get(interval, 0) for interval in ROLLUP_BUCKETS)
+        upsert = sqlite_insert(rollup_t)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[rollup_t.c.interval, rollup_t.c.coin_id, rollup_t.c.dt],
+            set_={
+                "balance": upsert.excluded.balance,
+                "usd_price": upsert.excluded.usd_price,
+                "btc_price": upsert.excluded.btc_price,
+                "sample_dt": upsert.excluded.sample_dt,
+            },
+            where=upsert.excluded.sample_dt >= rollup_t.c.sample_dt,
+        )
+        watermark_upsert = sqlite_insert(watermark_t)
+        watermark_upsert = watermark_upsert.on_conflict_do_update(
+            index_elements=[watermark_t.c.interval],
+            set_={"last_id": watermark_upsert.excluded.last_id},
+        )
+        # A large backlog, e.g. the first run on an existing database, is read in id order batches
+        while True:
+            rows = session.execute(
+                select(
+                    cv_t.c.id,
+                    cv_t.c.coin_id,
+                    cv_t.c.balance,
+                    cv_t.c.usd_price,
+                    cv_t.c.btc_price,
+                    cv_t.c.dt,
+                )
+                .where(cv_t.c.id > last_id)
+                .order_by(cv_t.c.id)
+                .limit(ROLLUP_BATCH_SIZE)
+            ).all()
+            if not rows:
+                return last_id
+            for interval, get_bucket in ROLLUP_BUCKETS.items():
+                interval_last_id = watermarks.get(interval, 0)
+                buckets = {}
+                for row in rows:
+                    if row.id > interval_last_id:
+                        key = (row.coin_id, get_bucket(row.dt))
+                        if key not in buckets or buckets[key].dt <= row.dt:
+                            buckets[key] = row
+                if buckets:
+                    session.execute(
+                        upsert,
+                        [
+                            {
+                                "coin_id": coin_id,
+                                "interval": interval,
+                                "balance": row.balance,
+                                "usd_price": row.usd_price,
+                                "btc_price": row.btc_price,
+                                "dt": bucket,
+                                "sample_dt": row.dt,
+                            }
+                            for (coin_id, bucket), row in buckets.items()
+                        ],
+                    )
+            last_id = rows[-1].id
+            watermarks = dict.fromkeys(ROLLUP_BUCKETS, last_id)
+            session.execute(
+                watermark_upsert,
+                [{"interval": interval, "last_id": last_id} for interval in ROLLUP_BUCKETS],
             )
+            if len(rows) < ROLLUP_BATCH_SIZE:
+                return last_id
 
-        hourly_update_query = _update_query(_datetime_id_query("%H"), models.Interval.HOURLY)
-        weekly_update_query = _update_query(_datetime_id_query("%Y-%W"), models.Interval.WEEKLY)
-        daily_update_query = _update_query(_datetime_id_query("%Y-%j"), models.Interval.DAILY)
+    def rollup_value_history(self):
         session: Session
         with self.db_session() as session:
-            session.execute(hourly_update_query)
-            session.execute(daily_update_query)
-            session.execute(weekly_update_query)
-            session.commit()
-            time_diff = datetime.now() - relativedelta(days=1)
-            session.query(models.CoinValue).filter(
-                models.CoinValue.interval == models.Interval.MINUTELY,
-                models.CoinValue.dt < time_diff,
-            ).delete()
-            time_diff = datetime.now() - relativedelta(months=1)
-            session.query(models.CoinValue).filter(
-                models.CoinValue.interval == models.Interval.HOURLY,
-                models.CoinValue.dt < time_diff,
-            ).delete()
-            time_diff = datetime.now() - relativedelta(years=1)
+            self._rollup_value_history(session)
+
+    def prune_value_history(self):
+        now = datetime.now()
+        session: Session
+        with self.db_session() as session:
+            last_id = self._rollup_value_history(session)
+            # Keeping the newest rolled up row stops SQLite from reusing ids below the watermark
             session.query(models.CoinValue).filter(
-                models.CoinValue.interval == models.Interval.DAILY,
-                models.CoinValue.dt < time_diff,
+                models.CoinValue.dt < now - relativedelta(days=1), models.CoinValue.id < last_id
             ).delete()
+            for interval, retention in ROLLUP_RETENTION.items():
+                session.query(models.CoinValueRollup).filter(
+                    models.CoinValueRollup.interval == interval,
+                    models.CoinValueRollup.dt < now - retention,
+                ).delete()
 
     def create_database(self):
         models.Base.metadata.create_all(self.engine)
-        try:
-            with self.db_session() as session:
-                session.execute("ALTER TABLE scout_history ADD COLUMN ratio_diff float;")
-        except Exception:
-            pass
+        with self.engine.begin() as connection:
+            scout_columns = {
+                column["name"] for column in inspect(connection).get_columns("scout_history")
+            }
+            if "ratio_diff" not in scout_columns:
+                connection.execute(text("ALTER TABLE scout_history ADD COLUMN ratio_diff float"))
+            # Rollups moved to coin_value_rollup, so nothing filters coin_value by interval anymore
+            connection.execute(text("DROP INDEX IF EXISTS ix_coin_value_interval_dt"))
+            for table in models.Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(connection, checkfirst=True)
+        # Catch up on samples logged while the trader was stopped or before the rollups existed
+        self.rollup_value_history()
+
+    def explain_query_plans(self) -> dict[str, list[str]]:
+        dt = datetime.now()
+        scout_t = self.scout_history_query(dt)
+        queries = {
+            "get_current_coin": select(models.CurrentCoin)
+            .order_by(models.CurrentCoin.dt.desc())
+            .limit(1),
+            "prune_scout_history": select(models.ScoutHistory.id).where(
+                models.ScoutHistory.dt < dt
+            ),
+            "prune_value_history": select(models.CoinValue.id).where(models.CoinValue.dt < dt),
+            "rollup_value_history": select(models.CoinValue.id).where(models.CoinValue.id > 0),
+            "value_history": select(models.CoinValue)
+            .where(models.CoinValue.coin_id == "", models.CoinValue.dt > dt)
+            .order_by(models.CoinValue.coin_id.asc(), models.CoinValue.dt.asc()),
+            "total_value_history": select(models.CoinValue.dt, func.sum(models.CoinValue.balance))
+            .where(models.CoinValue.dt > dt)
+            .group_by(models.CoinValue.dt),
+            "trade_history": select(models.Trade)
+            .where(models.Trade.dt > dt)
+            .order_by(models.Trade.dt.asc()),
+            "scouting_history": select(scout_t)
+            .join(models.Pair, models.Pair.id == scout_t.c.pair_id)
+            .where(models.Pair.from_coin_id == "")
+            .order_by(scout_t.c.dt.asc()),
+        }
+        plans = {}
+        with self.engine.connect() as connection:
+            for name, query in queries.items():
+                compiled = query.compile(self.engine)
+                # Plans don't depend on the bound values, so NULLs are enough
+                rows = connection.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {compiled}", (None,) * len(compiled.positiontup)
+                )
+                plans[name] = [row[3] for row in rows]
+        return plans
+
+    def log_query_plans(self):
+        for name, plan in self.explain_query_plans().items():
+            self.logger.debug(f"Query plan for {name}: {'; '.join(plan)}")
 
     def start_trade_log(self, from_coin: str, to_coin: str, selling: bool):
         return TradeLog(self, from_coin, to_coin, selling)
 
-    def send_update(self, model: models.Model):
-        if not self._api_session():
+    @heavy_call
+    def log_trade(
+        self,
+        from_coin: str,
+        to_coin: str,
+        selling: bool,
+        alt_starting_balance: float,
+        crypto_starting_balance: float,
+        alt_trade_amount: float,
+        crypto_trade_amount: float,
+    ):
+        trade = models.Trade(from_coin, to_coin, selling)
+        trade.alt_starting_balance = alt_starting_balance
+        trade.crypto_starting_balance = crypto_starting_balance
+        trade.alt_trade_amount = alt_trade_amount
+        trade.crypto_trade_amount = crypto_trade_amount
+        trade.state = models.TradeState.COMPLETE
+
+        def _log_trade(session: Session):
+            session.add(trade)
+            session.flush()
+            self.send_update(session, trade)
+
+        self.write(_log_trade)
+
+    def send_update(self, session: Session, model: models.Model):
+        if self.publisher is None:
             return
-        self.socketio_client.emit(
-            event="update",
-            data={"table": model.__tablename__, "data": model.info()},
-            namespace="/backend",
+        table, data = model.__tablename__, model.info()
+        # Group commits can fail and be retried, so only publish once the row is committed
+        event.listen(
+            session,
+            "after_commit",
+            lambda _: self.publisher.publish(table, data.get("id"), data),
+            once=True,
         )
 
-    @heavy_call
-    def commit_ratios(self):
-        dirty_cells = self.ratios_manager.get_dirty()
-        if len(dirty_cells) == 0:
+    def _update_pair_ratios(self, cells: list[tuple[int, float]], durable: bool = False):
+        if not cells:
             return
         pair_t = models.Pair.__table__
         stmt = (
@@ -245,64 +611,137 @@ class Database:
             .where(pair_t.c.id == bindparam("pair_id"))
             .values(ratio=bindparam("pair_ratio"))
         )
-        with self.db_session() as session:
-            session.execute(
-                stmt,
+        rows = [{"pair_id": pair_id, "pair_ratio": ratio} for pair_id, ratio in cells]
+        if durable:
+            with self.db_session() as session:
+                session.execute(stmt, rows)
+            return
+        self.write(lambda session: session.execute(stmt, rows))
+
+    @heavy_call
+    def commit_ratios(self):
+        dirty_cells = self.ratios_manager.get_dirty()
+        if len(dirty_cells) == 0:
+            return
+        if self.ratio_store is not None:
+            self.ratio_store.write(self.ratios_manager, dirty_cells)
+            self._unsynced_ratios.update(dirty_cells)
+        elif self.ratio_journal is not None:
+            self.ratio_journal.append(
+                [
+                    (from_idx, to_idx, self.ratios_manager.get(from_idx, to_idx))
+                    for from_idx, to_idx in dirty_cells
+                ]
+            )
+            self._unsynced_ratios.update(dirty_cells)
+        else:
+            # The pairs table is the only copy of these ratios, so don't leave them in the queue
+            self._update_pair_ratios(
                 [
-                    {
-                        "pair_id": self.ratios_manager.get_pair_id(from_idx, to_idx),
-                        "pair_ratio": self.ratios_manager.get(from_idx, to_idx),
-                    }
+                    (
+                        self.ratios_manager.get_pair_id(from_idx, to_idx),
+                        self.ratios_manager.get(from_idx, to_idx),
+                    )
                     for from_idx, to_idx in dirty_cells
                 ],
+                durable=True,
             )
         self.ratios_manager.commit()
+        if self.publisher is not None:
+            # Serialized on the publisher thread from the immutable snapshot, and only the newest
+            # one pending when a frame goes out
+            self.publisher.publish("ratios", None, self.ratios_manager.snapshot().info)
+
+    def sync_ratios(self):
+        if self.ratio_store is None and self.ratio_journal is None:
+            return
+        full_sync = self._full_ratio_sync
+        if full_sync:
+            with self.db_session() as session:
+                pair_t = models.Pair.__table__
+                db_ratios = dict(session.execute(select(pair_t.c.id, pair_t.c.ratio)).all())
+            cells = [
+                (pair_id, ratio)
+                for pair_id, ratio in self.ratio_store.get_cells()
+                if db_ratios.get(pair_id) != ratio
+            ]
+        else:
+            cells = [
+                (
+                    self.ratios_manager.get_pair_id(from_idx, to_idx),
+                    self.ratios_manager.get(from_idx, to_idx),
+                )
+                for from_idx, to_idx in self._unsynced_ratios
+            ]
+        # Written in its own session so a failure raises here, before anything is forgotten or
+        # the journal is truncated, and the next sync retries the same cells
+        self._update_pair_ratios(cells, durable=True)
+        if full_sync:
+            self._full_ratio_sync = False
+        self._unsynced_ratios.clear()
+        if self.ratio_journal is not None:
+            self.ratio_journal.reset([coin.symbol for coin in CoinStub.get_all()])
 
     def batch_update_coin_values(self, cv_batch: list[models.CoinValue]):
-        session: Session
-        with self.db_session() as session:
-            session.execute(
-                insert(models.CoinValue),
-                [
-                    {
-                        "coin_id": cv.coin.symbol,
-                        "balance": cv.balance,
-                        "usd_price": cv.usd_price,
-                        "btc_price": cv.btc_price,
-                        "interval": cv.interval,
-                        "dt": cv.dt,
-                    }
-                    for cv in cv_batch
-                ],
-            )
+        rows = [
+            {
+                "coin_id": cv.coin.symbol,
+                "balance": cv.balance,
+                "usd_price": cv.usd_price,
+                "btc_price": cv.btc_price,
+                "interval": cv.interval,
+                "dt": cv.dt,
+            }
+            for cv in cv_batch
+        ]
+
+        def _log_values(session: Session):
+            session.execute(insert(models.CoinValue), rows)
+            # Keep the rollups current so the long period views don't wait for the hourly prune
+            self._rollup_value_history(session)
+
+        self.write(_log_values)
 
 
+# For orders whose fill arrives after the order call returns. Trades with a known outcome go
+# through Database.log_trade instead, so the row is first written once the order is placed
 class TradeLog:
     def __init__(self, db: Database, from_coin: str, to_coin: str, selling: bool):
         self.db = db
-        session: Session
-        with self.db.db_session() as session:
-            self.trade = models.Trade(from_coin, to_coin, selling)
-            session.add(self.trade)
+        self.from_coin = from_coin
+        self.to_coin = to_coin
+        self.selling = selling
+        self.values: dict[str, Any] = {}
+        # Only read and set by the writer thread
+        self.trade_id: int | None = None
+
+    def _write(self, **values: Any):
+        self.values.update(values)
+        values = dict(self.values)
+
+        def _write_trade(session: Session):
+            trade = None if self.trade_id is None else session.get(models.Trade, self.trade_id)
+            if trade is None:
+                # First transition, or the one that inserted the row failed
+                trade = models.Trade(self.from_coin, self.to_coin, self.selling)
+                session.add(trade)
+            for name, value in values.items():
+                setattr(trade, name, value)
             session.flush()
-            self.db.send_update(self.trade)
+            self.trade_id = trade.id
+            self.db.send_update(session, trade)
+
+        self.db.write(_write_trade)
 
     def set_ordered(
         self, alt_starting_balance: float, crypto_starting_balance: float, alt_trade_amount: float
     ):
-        session: Session
-        with self.db.db_session() as session:
-            trade: models.Trade = session.merge(self.trade)
-            trade.alt_starting_balance = alt_starting_balance
-            trade.alt_trade_amount = alt_trade_amount
-            trade.crypto_starting_balance = crypto_starting_balance
-            trade.state = models.TradeState.ORDERED
-            self.db.send_update(trade)
+        self._write(
+            alt_starting_balance=alt_starting_balance,
+            crypto_starting_balance=crypto_starting_balance,
+            alt_trade_amount=alt_trade_amount,
+            state=models.TradeState.ORDERED,
+        )
 
     def set_complete(self, crypto_trade_amount: float):
-        session: Session
-        with self.db.db_session() as session:
-            trade: models.Trade = session.merge(self.trade)
-            trade.crypto_trade_amount = crypto_trade_amount
-            trade.state = models.TradeState.COMPLETE
-            self.db.send_update(trade)
+        self._write(crypto_trade_amount=crypto_trade_amount, state=models.TradeState.COMPLETE)
@@ -0,0 +1,103 @@
+import traceback
+from collections.abc import Callable
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from .logger import AbstractLogger
+
+DatabaseWrite = Callable[[Session], None]
+
+
+class DatabaseWriter:
+    def __init__(
+        self,
+        logger: AbstractLogger,
+        engine: Engine,
+        max_queue_size: int = 1000,
+        max_batch_size: int = 100,
+    ):
+        self.logger = logger
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.queue: Queue[DatabaseWrite | None] = Queue(max_queue_size)
+        self.thread: Thread | None = None
+        self._start_lock = Lock()
+        self.max_depth = 0
+        self.blocked_puts = 0
+        self.batches = 0
+        self.writes = 0
+        self.failed_writes = 0
+
+    def submit(self, write: DatabaseWrite):
+        if self.thread is None:
+            with self._start_lock:
+                if self.thread is None:
+                    self.thread = Thread(target=self._run, name="DatabaseWriter", daemon=True)
+                    self.thread.start()
+        try:
+            self.queue.put_nowait(write)
+        except Full:
+            self.blocked_puts += 1
+            self.logger.warning("Database write queue is full, waiting for the writer")
+            self.queue.put(write)
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            writes = [write for write in batch if write is not None]
+            if writes:
+                self._commit(writes)
+            for _ in batch:
+                self.queue.task_done()
+            if len(writes) != len(batch):
+                return
+
+    def _commit(self, writes: list[DatabaseWrite]):
+        try:
+            with Session(self.engine) as session, session.begin():
+                for write in writes:
+                    write(session)
+            self.batches += 1
+            self.writes += len(writes)
+            return
+        except Exception:
+            self.logger.error(traceback.format_exc())
+        # Retry one by one so that a single bad write doesn't drop the whole group
+        for write in writes:
+            try:
+                with Session(self.engine) as session, session.begin():
+                    write(session)
+                self.batches += 1
+                self.writes += 1
+            except Exception:
+                self.failed_writes += 1
+                self.logger.error(traceback.format_exc())
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "blocked_puts": self.blocked_puts,
+            "batches": self.batches,
+            "writes": self.writes,
+            "failed_writes": self.failed_writes,
+        }
+
+    def flush(self):
+        if self.thread is not None:
+            self.queue.join()
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
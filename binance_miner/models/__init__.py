@@ -1,9 +1,10 @@
 from .base import Base, Model
 from .coin import Coin
 from .coin_value import CoinValue, Interval
+from .coin_value_rollup import CoinValueRollup, RollupWatermark
 from .current_coin import CurrentCoin
-from .pair import Pair
-from .scout_history import ScoutHistory
+from .pair import Pair, PairIdToken
+from .scout_history import ScoutHistory, parse_scout_partition, scout_history_partition
 from .trade import Trade, TradeState
 
 __all__ = [
@@ -11,9 +12,14 @@ __all__ = [
     "Model",
     "Coin",
     "CoinValue",
+    "CoinValueRollup",
     "CurrentCoin",
     "Pair",
+    "PairIdToken",
+    "RollupWatermark",
     "ScoutHistory",
+    "parse_scout_partition",
+    "scout_history_partition",
     "Trade",
     "TradeState",
     "Interval",
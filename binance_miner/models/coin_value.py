@@ -3,7 +3,7 @@
 import enum
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Enum, Float, ForeignKey, Integer, String
+from sqlalchemy import Column, DateTime, Enum, Float, ForeignKey, Index, Integer, String
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
@@ -18,33 +18,7 @@ class Interval(enum.Enum):
     WEEKLY = "WEEKLY"
 
 
-class CoinValue(Base):
-    __tablename__ = "coin_value"
-    id = Column(Integer, primary_key=True)
-    coin_id = Column(String, ForeignKey("coins.symbol"))
-    coin = relationship("Coin")
-    balance = Column(Float)
-    usd_price = Column(Float)
-    btc_price = Column(Float)
-    interval: Column[str] = Column(Enum(Interval))
-    dt = Column(DateTime)
-
-    def __init__(
-        self,
-        coin: Coin,
-        balance: float,
-        usd_price: float,
-        btc_price: float,
-        interval: Interval = Interval.MINUTELY,
-        dt: datetime | None = None,
-    ):
-        self.coin = coin
-        self.balance = balance
-        self.usd_price = usd_price
-        self.btc_price = btc_price
-        self.interval = interval
-        self.dt = dt or datetime.now()
-
+class CoinValueMixin:
     @hybrid_property
     def usd_value(self):
         if self.usd_price is None:
@@ -72,3 +46,36 @@ class CoinValue(Base):
             "btc_value": self.btc_value,
             "dt": self.dt.isoformat(),
         }
+
+
+class CoinValue(CoinValueMixin, Base):
+    __tablename__ = "coin_value"
+    id = Column(Integer, primary_key=True)
+    coin_id = Column(String, ForeignKey("coins.symbol"))
+    coin = relationship("Coin")
+    balance = Column(Float)
+    usd_price = Column(Float)
+    btc_price = Column(Float)
+    interval: Column[str] = Column(Enum(Interval))
+    dt = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_coin_value_dt", "dt"),
+        Index("ix_coin_value_coin_id_dt", "coin_id", "dt"),
+    )
+
+    def __init__(
+        self,
+        coin: Coin,
+        balance: float,
+        usd_price: float,
+        btc_price: float,
+        interval: Interval = Interval.MINUTELY,
+        dt: datetime | None = None,
+    ):
+        self.coin = coin
+        self.balance = balance
+        self.usd_price = usd_price
+        self.btc_price = btc_price
+        self.interval = interval
+        self.dt = dt or datetime.now()
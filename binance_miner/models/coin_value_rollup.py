@@ -0,0 +1,32 @@
+# https://docs.sqlalchemy.org/en/20/orm/extensions/mypy.html
+# mypy: disable-error-code=assignment
+from sqlalchemy import Column, DateTime, Enum, Float, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import relationship
+
+from .base import Base
+from .coin_value import CoinValueMixin, Interval
+
+
+class CoinValueRollup(CoinValueMixin, Base):
+    __tablename__ = "coin_value_rollup"
+    id = Column(Integer, primary_key=True)
+    coin_id = Column(String, ForeignKey("coins.symbol"))
+    coin = relationship("Coin")
+    interval: Column[str] = Column(Enum(Interval))
+    balance = Column(Float)
+    usd_price = Column(Float)
+    btc_price = Column(Float)
+    # Start of the bucket; sample_dt is the time of the last sample rolled into it
+    dt = Column(DateTime)
+    sample_dt = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_coin_value_rollup_bucket", "interval", "coin_id", "dt", unique=True),
+        Index("ix_coin_value_rollup_interval_dt", "interval", "dt"),
+    )
+
+
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermarks"
+    interval: Column[str] = Column(Enum(Interval), primary_key=True)
+    last_id = Column(Integer)
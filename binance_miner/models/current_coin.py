@@ -2,7 +2,7 @@
 # mypy: disable-error-code=assignment
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from .base import Base
@@ -16,6 +16,8 @@ class CurrentCoin(Base):
     coin = relationship("Coin")
     dt = Column(DateTime)
 
+    __table_args__ = (Index("ix_current_coin_history_dt", "dt"),)
+
     def __init__(self, coin: Coin):
         self.coin = coin
         self.dt = datetime.utcnow()
@@ -1,6 +1,6 @@
 # https://docs.sqlalchemy.org/en/20/orm/extensions/mypy.html
 # mypy: disable-error-code=assignment
-from sqlalchemy import Column, Float, ForeignKey, Integer, String, func, or_, select
+from sqlalchemy import Column, Float, ForeignKey, Index, Integer, String, func, or_, select
 from sqlalchemy.orm import MappedSQLExpression, column_property, relationship
 
 from .base import Base
@@ -22,6 +22,8 @@ class Pair(Base):
         .scalar_subquery()
     )
 
+    __table_args__ = (Index("ix_pairs_from_coin_id_to_coin_id", "from_coin_id", "to_coin_id"),)
+
     def __init__(self, from_coin: Coin, to_coin: Coin, ratio: float | None = None):
         self.from_coin = from_coin
         self.to_coin = to_coin
@@ -36,3 +38,10 @@ class Pair(Base):
             "to_coin": self.to_coin.info(),
             "ratio": self.ratio,
         }
+
+
+class PairIdToken(Base):
+    __tablename__ = "pair_id_tokens"
+    # Random per database and replaced whenever pairs are added, so a ratio store stamped with
+    # it can trust its pair ids without reading them back from the pairs table
+    token = Column(String, primary_key=True)
@@ -2,13 +2,16 @@
 # mypy: disable-error-code=assignment
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
 from .base import Base
 from .pair import Pair
 
+SCOUT_PARTITION_PREFIX = "scout_history_"
+SCOUT_PARTITION_FORMAT = "%Y%m%d%H"
+
 
 class ScoutHistory(Base):
     __tablename__ = "scout_history"
@@ -21,6 +24,11 @@ class ScoutHistory(Base):
     other_coin_price = Column(Float)
     dt = Column(DateTime)
 
+    __table_args__ = (
+        Index("ix_scout_history_dt", "dt"),
+        Index("ix_scout_history_pair_id_dt", "pair_id", "dt"),
+    )
+
     def __init__(
         self,
         pair: Pair,
@@ -52,3 +60,32 @@ class ScoutHistory(Base):
             "other_coin_price": self.other_coin_price,
             "dt": self.dt.isoformat(),
         }
+
+
+def scout_history_partition(start: datetime, metadata: MetaData) -> Table:
+    name = SCOUT_PARTITION_PREFIX + start.strftime(SCOUT_PARTITION_FORMAT)
+    table = metadata.tables.get(name)
+    if table is not None:
+        return table
+    return Table(
+        name,
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("pair_id", Integer),
+        Column("ratio_diff", Float),
+        Column("target_ratio", Float),
+        Column("current_coin_price", Float),
+        Column("other_coin_price", Float),
+        Column("dt", DateTime),
+        Index(f"ix_{name}_dt", "dt"),
+        Index(f"ix_{name}_pair_id_dt", "pair_id", "dt"),
+    )
+
+
+def parse_scout_partition(name: str) -> datetime | None:
+    if not name.startswith(SCOUT_PARTITION_PREFIX):
+        return None
+    try:
+        return datetime.strptime(name[len(SCOUT_PARTITION_PREFIX) :], SCOUT_PARTITION_FORMAT)
+    except ValueError:
+        return None
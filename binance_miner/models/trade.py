@@ -3,7 +3,7 @@
 import enum
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, DateTime, Enum, Float, ForeignKey, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, Enum, Float, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from .base import Base
@@ -30,6 +30,8 @@ class Trade(Base):
     crypto_trade_amount = Column(Float)
     dt = Column(DateTime)
 
+    __table_args__ = (Index("ix_trade_history_dt", "dt"),)
+
     def __init__(self, alt_coin: str, crypto_coin: str, selling: bool):
         self.alt_coin_id = alt_coin
         self.crypto_coin_id = crypto_coin
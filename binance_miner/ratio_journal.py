@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import math
+import os
+import struct
+
+RATIO_JOURNAL_MAGIC = b"BMJRNL01"
+RATIO_JOURNAL_HEADER = struct.Struct("<8sII")
+RATIO_JOURNAL_RECORD = struct.Struct("<IIdQ")
+# Closes a commit; its to_idx field holds the number of records in the commit
+RATIO_JOURNAL_COMMIT = 0xFFFFFFFF
+
+
+class RatioJournal:
+    def __init__(self, path: str):
+        self.path = path
+        self.seq = 0
+        self._file = None
+
+    def replay(self) -> list[tuple[str, str, float]]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "rb") as f:
+            raw_header = f.read(RATIO_JOURNAL_HEADER.size)
+            if len(raw_header) != RATIO_JOURNAL_HEADER.size:
+                return []
+            magic, n, symbols_len = RATIO_JOURNAL_HEADER.unpack(raw_header)
+            if magic != RATIO_JOURNAL_MAGIC:
+                return []
+            symbols = f.read(symbols_len).decode().split("\n") if n else []
+            if len(symbols) != n:
+                return []
+            body = f.read()
+        cells: dict[tuple[str, str], float] = {}
+        pending: list[tuple[int, int, float]] = []
+        # A torn trailing commit has no commit record and is dropped
+        for offset in range(
+            0, len(body) - RATIO_JOURNAL_RECORD.size + 1, RATIO_JOURNAL_RECORD.size
+        ):
+            from_idx, to_idx, value, seq = RATIO_JOURNAL_RECORD.unpack_from(body, offset)
+            if from_idx != RATIO_JOURNAL_COMMIT:
+                pending.append((from_idx, to_idx, value))
+                continue
+            if to_idx == len(pending) and all(i < n and j < n for i, j, _ in pending):
+                for i, j, val in pending:
+                    cells[(symbols[i], symbols[j])] = val
+            pending = []
+            self.seq = max(self.seq, seq)
+        return [(from_symbol, to_symbol, val) for (from_symbol, to_symbol), val in cells.items()]
+
+    def reset(self, symbols: list[str]):
+        self.close()
+        encoded_symbols = "\n".join(symbols).encode()
+        self._file = open(self.path, "wb")
+        self._file.write(
+            RATIO_JOURNAL_HEADER.pack(RATIO_JOURNAL_MAGIC, len(symbols), len(encoded_symbols))
+            + encoded_symbols
+        )
+        self._sync()
+
+    def append(self, cells: list[tuple[int, int, float]]):
+        self.seq += 1
+        records = [
+            RATIO_JOURNAL_RECORD.pack(from_idx, to_idx, val, self.seq)
+            for from_idx, to_idx, val in cells
+        ]
+        records.append(
+            RATIO_JOURNAL_RECORD.pack(RATIO_JOURNAL_COMMIT, len(cells), math.nan, self.seq)
+        )
+        self._file.write(b"".join(records))
+        self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
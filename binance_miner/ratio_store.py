@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import math
+import mmap
+import os
+import struct
+from collections.abc import Iterable
+
+from .ratios import CoinStub, RatiosManager
+
+RATIO_STORE_MAGIC = b"BMRATIO2"
+RATIO_STORE_HEADER = struct.Struct("<8s16sII")
+
+
+class RatioStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.symbols: list[str] = []
+        self.n = 0
+        self._file = None
+        self._mmap: mmap.mmap | None = None
+        self._data: memoryview | None = None
+        self._ids: memoryview | None = None
+
+    @staticmethod
+    def _layout(symbols: list[str], token: bytes) -> tuple[bytes, int, int]:
+        encoded_symbols = "\n".join(symbols).encode()
+        header = (
+            RATIO_STORE_HEADER.pack(RATIO_STORE_MAGIC, token, len(symbols), len(encoded_symbols))
+            + encoded_symbols
+        )
+        offset = -(-len(header) // 8) * 8
+        return header, offset, offset + 16 * len(symbols) * len(symbols)
+
+    def _map(self, symbols: list[str], token: bytes, create: bool):
+        self.close()
+        header, offset, size = self._layout(symbols, token)
+        if create:
+            with open(self.path, "wb") as f:
+                f.write(header)
+                f.truncate(size)
+        self._file = open(self.path, "r+b")
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        cells = len(symbols) * len(symbols)
+        view = memoryview(self._mmap)
+        self._data = view[offset : offset + 8 * cells].cast("d")
+        self._ids = view[offset + 8 * cells : size].cast("Q")
+        self.symbols = symbols
+        self.n = len(symbols)
+
+    def read_header(self) -> tuple[bytes, list[str]] | None:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "rb") as f:
+            raw_header = f.read(RATIO_STORE_HEADER.size)
+            if len(raw_header) != RATIO_STORE_HEADER.size:
+                return None
+            magic, token, n, symbols_len = RATIO_STORE_HEADER.unpack(raw_header)
+            if magic != RATIO_STORE_MAGIC:
+                return None
+            symbols = f.read(symbols_len).decode().split("\n") if n else []
+            if len(symbols) != n or os.path.getsize(self.path) < self._layout(symbols, token)[2]:
+                return None
+            return token, symbols
+
+    def open(self, token: bytes) -> bool:
+        symbols = [coin.symbol for coin in CoinStub.get_all()]
+        if self.read_header() != (token, symbols):
+            return False
+        self._map(symbols, token, create=False)
+        return True
+
+    def open_existing(self) -> bool:
+        header = self.read_header()
+        if header is None:
+            return False
+        self._map(header[1], header[0], create=False)
+        return True
+
+    def load(self) -> RatiosManager:
+        return RatiosManager.from_buffers(self._data.cast("B"), self._ids.cast("B"))
+
+    def save(self, ratios_manager: RatiosManager, token: bytes):
+        self._map([coin.symbol for coin in CoinStub.get_all()], token, create=True)
+        self._data[:] = ratios_manager.get_all()
+        self._ids[:] = ratios_manager.get_all_pair_ids()
+        self.flush()
+
+    def write(self, ratios_manager: RatiosManager, cells: Iterable[tuple[int, int]]):
+        for from_idx, to_idx in cells:
+            self._data[self.n * from_idx + to_idx] = ratios_manager.get(from_idx, to_idx)
+        self.flush()
+
+    def get_pair_ids(self) -> dict[tuple[str, str], int]:
+        return {
+            (from_symbol, to_symbol): pair_id
+            for from_idx, from_symbol in enumerate(self.symbols)
+            for to_symbol, pair_id in zip(
+                self.symbols, self._ids[self.n * from_idx : self.n * (from_idx + 1)]
+            )
+            if pair_id != 0
+        }
+
+    def get_cells(self) -> list[tuple[int, float]]:
+        return [
+            (pair_id, ratio)
+            for pair_id, ratio in zip(self._ids, self._data)
+            if pair_id != 0 and not math.isnan(ratio)
+        ]
+
+    def flush(self):
+        if self._mmap is not None:
+            self._mmap.flush()
+
+    def close(self):
+        if self._mmap is not None:
+            self._data.release()
+            self._ids.release()
+            self._mmap.close()
+            self._file.close()
+        self._file = self._mmap = self._data = self._ids = None
@@ -6,8 +6,6 @@ import math
 from array import array
 from collections.abc import Iterable, KeysView
 
-from .models import Pair
-
 
 class CoinStub:
     _instances: list[CoinStub] = []
@@ -50,9 +48,37 @@ class CoinStub:
         return cls._instances
 
 
+class RatiosSnapshot:
+    def __init__(self, version: int, symbols: tuple[str, ...], data: array):
+        self.version = version
+        self.symbols = symbols
+        self.n = len(symbols)
+        self._data = data
+
+    def get(self, from_coin_idx: int, to_coin_idx: int) -> float:
+        return self._data[self.n * from_coin_idx + to_coin_idx]
+
+    def get_from_coin(self, from_coin_idx: int):
+        return self._data[self.n * from_coin_idx : self.n * (from_coin_idx + 1)]
+
+    def get_to_coin(self, to_coin_idx: int):
+        return self._data[to_coin_idx :: self.n]
+
+    def info(self):
+        return {
+            "version": self.version,
+            "coins": list(self.symbols),
+            "ratios": [
+                [None if math.isnan(ratio) else ratio for ratio in self.get_from_coin(i)]
+                for i in range(self.n)
+            ],
+        }
+
+
 class RatiosManager:
-    def __init__(self, ratios: Iterable[Pair] | None = None):
+    def __init__(self, ratios: Iterable[tuple[int, str, str, float | None]] | None = None):
         self.n = CoinStub.len_coins()
+        self.symbols = tuple(coin.symbol for coin in CoinStub.get_all())
         self._data = array(
             "d", (math.nan if i != j else 1.0 for i in range(self.n) for j in range(self.n))
         )
@@ -60,17 +86,33 @@ class RatiosManager:
         self._ids: array | None = None
         if ratios is not None:
             self._ids = array("Q", (0 for _ in range(self.n * self.n)))
-            for pair in ratios:
-                i = CoinStub.get_by_symbol(pair.from_coin.symbol).idx
-                j = CoinStub.get_by_symbol(pair.to_coin.symbol).idx
-                val = pair.ratio if pair.ratio is not None else math.nan
-                pair_id = pair.id if pair.id is not None else 0
+            for pair_id, from_symbol, to_symbol, ratio in ratios:
+                i = CoinStub.get_by_symbol(from_symbol).idx
+                j = CoinStub.get_by_symbol(to_symbol).idx
+                val = ratio if ratio is not None else math.nan
+                pair_id = pair_id if pair_id is not None else 0
                 idx = self.n * i + j
                 self._data[idx] = val
                 self._ids[idx] = pair_id
+        self._version = 0
+        self._publish()
+
+    @classmethod
+    def from_buffers(cls: type[RatiosManager], data, ids) -> RatiosManager:
+        ratios_manager = cls()
+        ratios_manager._data = array("d")
+        ratios_manager._data.frombytes(data)
+        ratios_manager._ids = array("Q")
+        ratios_manager._ids.frombytes(ids)
+        ratios_manager._publish()
+        return ratios_manager
 
     def set(self, from_coin_idx: int, to_coin_idx: int, val: float):
         cell = (from_coin_idx, to_coin_idx)
+        if self._shared:
+            # The last snapshot holds this array, so the first write after a commit copies it
+            self._data = self._data[:]
+            self._shared = False
         if cell not in self._dirty:
             self._dirty[cell] = self._data[self.n * cell[0] + cell[1]]
         self._data[self.n * cell[0] + cell[1]] = val
@@ -84,16 +126,32 @@ class RatiosManager:
     def get_to_coin(self, to_coin_idx: int):
         return self._data[to_coin_idx :: self.n]
 
+    def get_all(self):
+        return self._data[:]
+
     def get_dirty(self) -> KeysView[tuple[int, int]]:
         return self._dirty.keys()
 
     def get_pair_id(self, from_coin_idx: int, to_coin_idx: int) -> int:
         return self._ids[from_coin_idx * self.n + to_coin_idx]
 
+    def get_all_pair_ids(self):
+        return self._ids[:]
+
     def rollback(self):
         for cell, old_value in self._dirty.items():
             self._data[self.n * cell[0] + cell[1]] = old_value
         self._dirty.clear()
 
     def commit(self):
-        self._dirty.clear()
+        if self._dirty:
+            self._dirty.clear()
+            self._publish()
+
+    def _publish(self):
+        self._version += 1
+        self._snapshot = RatiosSnapshot(self._version, self.symbols, self._data)
+        self._shared = True
+
+    def snapshot(self) -> RatiosSnapshot:
+        return self._snapshot
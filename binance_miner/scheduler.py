@@ -1,4 +1,6 @@
+import time
 import traceback
+from collections.abc import Callable
 from datetime import datetime
 
 from schedule import Job, Scheduler
@@ -21,3 +23,31 @@ class SafeScheduler(Scheduler):
             job.last_run = datetime.now()
             if not self.rerun_immediately:
                 job._schedule_next_run()
+
+
+class EventTrigger:
+    def __init__(
+        self,
+        logger: AbstractLogger,
+        wait: Callable[[float], bool],
+        job: Callable[[], object],
+        min_interval: float,
+    ):
+        self.logger = logger
+        self.wait = wait
+        self.job = job
+        self.min_interval = min_interval
+        self.last_run = 0.0
+
+    def run_pending(self, timeout: float):
+        if not self.wait(timeout):
+            return
+        # Events arriving while we hold off are coalesced into this run
+        delay = self.last_run + self.min_interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            self.job()
+        except Exception:
+            self.logger.error(traceback.format_exc())
+        self.last_run = time.monotonic()
@@ -0,0 +1,134 @@
+import traceback
+from collections import OrderedDict
+from collections.abc import Callable
+from threading import Condition, Thread
+from typing import Any
+
+from socketio import Client, exceptions
+
+from .logger import AbstractLogger
+
+UpdateKey = tuple[str, Any]
+
+
+class UpdatePublisher:
+    def __init__(
+        self,
+        logger: AbstractLogger,
+        url: str,
+        max_pending: int = 1000,
+        batch_delay: float = 0.05,
+        retry_delay: float = 5,
+    ):
+        self.logger = logger
+        self.url = url
+        self.max_pending = max_pending
+        self.batch_delay = batch_delay
+        self.retry_delay = retry_delay
+        self.client = Client()
+        self.pending: OrderedDict[UpdateKey, dict[str, Any]] = OrderedDict()
+        self._condition = Condition()
+        self._closing = False
+        self.thread: Thread | None = None
+        self.coalesced = 0
+        self.dropped = 0
+        self.frames = 0
+        self.updates = 0
+
+    def publish(self, table: str, key: Any, data: dict[str, Any] | Callable[[], dict[str, Any]]):
+        with self._condition:
+            if self.thread is None:
+                self.thread = Thread(target=self._run, name="UpdatePublisher", daemon=True)
+                self.thread.start()
+            # Only the newest state of a row is worth sending
+            if self.pending.pop((table, key), None) is not None:
+                self.coalesced += 1
+            self.pending[(table, key)] = {"table": table, "data": data}
+            if len(self.pending) > self.max_pending:
+                self.pending.popitem(last=False)
+                self.dropped += 1
+            self._condition.notify()
+
+    def _connect(self) -> bool:
+        if self.client.connected and self.client.namespaces:
+            return True
+        try:
+            if not self.client.connected:
+                self.client.connect(
+                    self.url, socketio_path="/ws/socket.io", namespaces=["/backend"]
+                )
+            return bool(self.client.namespaces)
+        except exceptions.ConnectionError:
+            return False
+
+    def _take(self) -> OrderedDict[UpdateKey, dict[str, Any]] | None:
+        with self._condition:
+            while not self.pending and not self._closing:
+                self._condition.wait()
+            # Closing still drains whatever is pending
+            if not self.pending:
+                return None
+            # Give a burst of updates the chance to land in the same frame
+            self._condition.wait_for(lambda: self._closing, self.batch_delay)
+            batch, self.pending = self.pending, OrderedDict()
+            return batch
+
+    def _restore(self, batch: OrderedDict[UpdateKey, dict[str, Any]]):
+        with self._condition:
+            # Updates queued while sending are newer than the ones that failed
+            batch.update(self.pending)
+            while len(batch) > self.max_pending:
+                batch.popitem(last=False)
+                self.dropped += 1
+            self.pending = batch
+
+    @staticmethod
+    def _build(update: dict[str, Any]) -> dict[str, Any]:
+        # Callables are expensive payloads built here, once per frame, instead of by the caller
+        data = update["data"]
+        return {"table": update["table"], "data": data() if callable(data) else data}
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            if self._connect():
+                try:
+                    self.client.emit(
+                        event="updates",
+                        data={"updates": [self._build(update) for update in batch.values()]},
+                        namespace="/backend",
+                    )
+                    self.frames += 1
+                    self.updates += len(batch)
+                    continue
+                except Exception:
+                    self.logger.warning(traceback.format_exc())
+            self._restore(batch)
+            with self._condition:
+                if self._closing:
+                    # That was the last attempt, nothing retries after close
+                    self.dropped += len(self.pending)
+                    self.pending.clear()
+                    return
+                self._condition.wait_for(lambda: self._closing, self.retry_delay)
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            "pending": len(self.pending),
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "frames": self.frames,
+            "updates": self.updates,
+        }
+
+    def close(self):
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.client.connected:
+            self.client.disconnect()